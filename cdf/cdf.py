@@ -18,13 +18,34 @@ along with this script. If not, see <http://www.gnu.org/licenses/>.
 cdf.py
 In: hv data
 Out: CDF plots
+
+The mean hypervolume of each set comes from the metrics
+table (see statistics/tablestore.py) if there is one made
+from the metrics as they are now, otherwise from the
+Set_mean stats file.
 """
+import os
+import sys
 import argparse
 import pandas
 import matplotlib
 # svg is not realistic due to the number of points being plotted
 from matplotlib.backends import backend_agg as agg
 import numpy
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "statistics"))
+import tablestore
+
+def set_means(algo, ndv, objectives):
+    problem = "{0}_{1}_{2}".format(algo, ndv, objectives)
+    hvfile = "/gpfs/scratch/mjw5407/task1/hv/{0}.hv".format(problem)
+    table = tablestore.tablename(hvfile)
+    if tablestore.is_fresh(table, [hvfile]):
+        data = tablestore.TableStore(table).frame(
+                                    ["Set", "Hypervolume"])
+        return data.groupby("Set", as_index=False).mean()
+    return pandas.read_table("/gpfs/scratch/mjw5407/task1/stats/"\
+                             "Set_mean_{0}".format(problem), sep=" ")
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -57,7 +78,7 @@ def cdf(fig, objectives, algorithms):
         for algo in algos:
             counter += 1
             ax = fig.add_subplot(nrows, ncols, counter)
-            hv = pandas.read_table("/gpfs/scratch/mjw5407/task1/stats/Set_mean_{0}_{1}_{2}".format(algo, ndv, objectives), sep=" ")
+            hv = set_means(algo, ndv, objectives)
             hv.sort(["Hypervolume"], inplace=True)
             best = max(best, hv.Hypervolume.max())
             ax.plot(hv.Hypervolume, linewidth=4)
@@ -104,7 +125,7 @@ def shady(fig, objectives):
     hvs = []
     for ndv in dvs:
         for algo in algos:
-            hv = pandas.read_table("/gpfs/scratch/mjw5407/task1/stats/Set_mean_{0}_{1}_{2}".format(algo, ndv, objectives), sep=" ")
+            hv = set_means(algo, ndv, objectives)
             hvs.append(hv)
             best = max(best, hv.Hypervolume.max())
 
@@ -159,7 +180,7 @@ def get_tables(algos, dvs, objectives):
     hvs = []
     for ndv in dvs:
         for algo in algos:
-            hv = pandas.read_table("/gpfs/scratch/mjw5407/task1/stats/Set_mean_{0}_{1}_{2}".format(algo, ndv, objectives), sep=" ")
+            hv = set_means(algo, ndv, objectives)
             hvs.append(hv)
     return hvs
 
@@ -17,13 +17,22 @@ along with this script. If not, see <http://www.gnu.org/licenses/>.
 ===========================================================
 contour.py
 joint performance contours.
+
+Hypervolumes are read from the metrics tables (see
+statistics/tablestore.py) if they were made from the
+metrics as they are now, otherwise from the metrics files.
 """
+import os
+import sys
 import argparse
 import pandas
 import matplotlib
 # svg is not realistic due to the number of points being plotted
 from matplotlib.backends import backend_agg as agg
 import numpy
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "statistics"))
+import tablestore
 
 def get_args():
     description="Joint performance contour plot, showing 3 vs 10 "\
@@ -36,14 +45,14 @@ def get_args():
     return parser.parse_args()
 
 def countsandrange(algo):
-    ten = pandas.read_table(
+    ten = tablestore.load(
                             "/gpfs/scratch/mjw5407/task1/"\
                             "hv/{0}_27_10_1.0.hv".format(algo), 
-                            sep=" ")
-    three = pandas.read_table(
+                            columns=["Hypervolume"])
+    three = tablestore.load(
                             "/gpfs/scratch/mjw5407/task1/"\
                             "hv/{0}_27_3_0.1.hv".format(algo), 
-                            sep=" ")
+                            columns=["Hypervolume"])
     data = pandas.DataFrame({"ten": ten.Hypervolume, 
                              "three": three.Hypervolume})
     data["gthree"] = data.three.apply(
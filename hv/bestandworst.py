@@ -25,6 +25,8 @@ import os
 import re
 import argparse
 import sys
+import numpy
+import setsfile
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -38,30 +40,26 @@ def get_args():
     return parser.parse_args()
 
 def scan(stream, first, last):
-    counter = 0
+    """
+    Columns first through last are the objectives.  Only
+    complete sets are scanned, the same as the hypervolume
+    and reference set tools.
+    """
     best = None
     worst = None
-    line = True
-    while line != '':
-        line = stream.readline()
-        if line is '':
-            break
-        if not re.match("[0-9.\-eE ]+", line):
+    nobj = last - first + 1
+    for block in setsfile.read_blocks(stream, first, nobj):
+        if len(block) == 0:
             continue
-        row = line.split(" ")
-        if len(row) < last + 1:
-            continue
-        row = [float(val) for val in row]
         if best is None:
-            best = row[first:last+1]
-            worst = row[first:last+1]
+            best = block.min(0)
+            worst = block.max(0)
         else:
-            best = [min(best[ii], row[first+ii]) 
-                    for ii in range(len(best))]
-            worst = [max(worst[ii], row[first+ii]) 
-                     for ii in range(len(worst))]
-        counter += 1
-    return best, worst
+            best = numpy.minimum(best, block.min(0))
+            worst = numpy.maximum(worst, block.max(0))
+    if best is None:
+        return best, worst
+    return best.tolist(), worst.tolist()
 
 def cli():
     args = get_args()
@@ -17,19 +17,28 @@ along with this script. If not, see <http://www.gnu.org/licenses/>.
 ===========================================================
 
 broaden_refset.py
-Take a file summarizing utopia and nadir points for each problem,
+Take files summarizing utopia and nadir points for each problem,
 along with the reference set for each set of objectives, and use 
 them to generate an expanded reference set that will force the
 hypervolume calculation to use a reasonable nadir point.
+Reference points that the axial points dominate are dropped,
+as the metrics would drop them anyway.  Dominance is judged
+on the objectives, the last columns of each row, so decision
+variables carried in the reference set don't count.
 """
 import argparse
 import os
 import copy
+import numpy
+from nondominated import nondominated
 
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("unfile", type=argparse.FileType("r"),
-                        help="file produced by scanproblem.py")
+                        nargs="+",
+                        help="files produced by scanproblem.py, "\
+                             "or .bounds files written beside "\
+                             "reference sets by ref/merge.py")
     parser.add_argument("objectives", help="10_1.0, 3_0.1, etc.")
     parser.add_argument("-r", "--refdir", 
                         help="directory with reference sets in it",
@@ -94,10 +103,16 @@ def write_refset(data, filename):
 
 def cli():
     args = get_args()
-    undata = read_unfile(args.unfile)
+    undata = []
+    for unfile in args.unfile:
+        undata.extend(read_unfile(unfile))
     axial = axial_points(args.objectives, undata)
     refset = read_refset(args.refdir, args.objectives)
     refset.extend(axial)
+    nobj = len(axial[0])
+    keep = nondominated(numpy.array([row[-nobj:]
+                                     for row in refset]))
+    refset = [row for row, kept in zip(refset, keep) if kept]
     write_refset(refset,
                  os.path.join(
                     args.output_dir, 
@@ -0,0 +1,135 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+
+compare_engines.py
+
+Check the native metrics engine against MOEAFramework's
+ResultFileEvaluator.  Evaluate a sets file with
+hypervolume.py and compare every set's metrics with the
+result of compute_hypervolumes.py --engine java --seed for
+the same file, which has a row per set, empty ones
+included.
+
+A difference is within tolerance if it is no more than
+tolerance times the larger of 1 and the Java value.
+Infinities must match exactly.  The exit status is 0 if
+every metric of every set is within tolerance, 1 if not.
+"""
+import sys
+import argparse
+import numpy
+import hypervolume
+from setsstore import load_sets
+
+class ComparisonError(Exception):
+    pass
+
+def read_java(filename):
+    """
+    {set index: metrics} from a single-reference seed
+    result, Seed Set followed by the six metrics
+    """
+    rows = {}
+    with open(filename, "r") as fp:
+        columns = fp.readline().split()
+        if columns[2:] != hypervolume.METRICS:
+            msg = "{0} doesn't have the columns Seed Set "\
+                  "{1}".format(filename,
+                               " ".join(hypervolume.METRICS))
+            raise ComparisonError(msg)
+        for line in fp:
+            fields = line.split()
+            rows[int(fields[1])] = numpy.array(
+                        [float(val) for val in fields[2:]])
+    return rows
+
+def differences(native, java):
+    """
+    |native - java| / max(1, |java|), with matching
+    infinities counted as no difference
+    """
+    native = numpy.asarray(native, dtype=float)
+    with numpy.errstate(invalid="ignore"):
+        found = numpy.abs(native - java) \
+              / numpy.maximum(1.0, numpy.abs(java))
+    found[native == java] = 0.0
+    found[numpy.isnan(found)] = numpy.inf
+    return found
+
+def compare(reference, sets, java, ndv, nobj):
+    """
+    (worst difference per metric, sets compared, set
+    indices missing from either side)
+    """
+    worst = numpy.zeros(len(hypervolume.METRICS))
+    seen = set()
+    for index, approximation in load_sets(sets, ndv, nobj):
+        seen.add(index)
+        if index not in java:
+            continue
+        native = hypervolume.evaluate(approximation,
+                                      [reference])[0]
+        worst = numpy.maximum(worst,
+                              differences(native, java[index]))
+    compared = len(seen & set(java))
+    missing = sorted(seen ^ set(java))
+    return worst, compared, missing
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("reference",
+                        help="file containing reference set")
+    parser.add_argument("sets",
+                        help="file or store containing "\
+                             "approximation sets")
+    parser.add_argument("java",
+                        help="compute_hypervolumes.py "\
+                             "--engine java --seed result "\
+                             "for the same sets")
+    parser.add_argument("nobj", type=int,
+                        help="number of objectives")
+    parser.add_argument("-n", "--ndv", type=int, default=0,
+                        help="number of decision variables")
+    parser.add_argument("-t", "--tolerance", type=float,
+                        default=1e-6,
+                        help="largest relative difference "\
+                             "allowed (default 1e-6)")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    reference = hypervolume.read_reference(args.reference,
+                                           args.nobj)
+    java = read_java(args.java)
+    worst, compared, missing = compare(reference, args.sets,
+                                       java, args.ndv,
+                                       args.nobj)
+    print "{0} sets compared".format(compared)
+    if missing:
+        print "sets in only one of them: {0}".format(
+                " ".join([str(index) for index in missing]))
+    for metric, difference in zip(hypervolume.METRICS, worst):
+        print "{0} {1!r}".format(metric, float(difference))
+    if missing or (worst > args.tolerance).any():
+        print "differences exceed {0}".format(args.tolerance)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
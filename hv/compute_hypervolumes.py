@@ -20,7 +20,11 @@ compute_hypervolumes.py
 
 Use MOEAFramework and the wfg2 hypervolume computation to
 compute hypervolume attainment for every run of an MOEA
-parameter sensitivity study.
+parameter sensitivity study.  Or, with --engine native,
+compute the same metrics in process with hypervolume.py.
+The native engine can also estimate hypervolume by
+Monte-Carlo sampling, which is much faster than the exact
+computation in ten objectives.
 
 Paths default to the ones most convenient for the author's
 purposes.  You should change them, or at least override
@@ -29,15 +33,50 @@ them on the command line.
 """
 from subprocess import Popen, PIPE
 import re
-import glob
 import os
 import argparse
-from emptysets import find_empty_sets
-from reduce_refset import awkscript
+import multiprocessing
+import hashlib
+import StringIO
+import setsfile
+import setsstore
+import hypervolume
+import hvcache
 
 class PathError(Exception):
     pass
 
+class EngineError(Exception):
+    pass
+
+class ShardError(Exception):
+    pass
+
+class SeedError(Exception):
+    pass
+
+def reference_tag(ref):
+    """
+    Column suffix identifying a reference set
+    """
+    tag = re.sub("\.ref$", "", os.path.basename(ref))
+    return re.sub("[^A-Za-z0-9]+", "_", tag)
+
+def header(refs, montecarlo=None):
+    """
+    With one reference set, the usual column names.  With
+    several, each set of metric columns is suffixed with its
+    reference set's tag.
+    """
+    metrics = hypervolume.metric_names(montecarlo)
+    if len(refs) == 1:
+        columns = metrics
+    else:
+        columns = ["{0}_{1}".format(metric, reference_tag(ref))
+                   for ref in refs
+                   for metric in metrics]
+    return "Seed Set {0}\n".format(" ".join(columns))
+
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("algo",
@@ -51,11 +90,14 @@ def get_args():
     parser.add_argument("eps", choices = [1.0, 0.1],
                         type=float,
                         help="epsilon scale")
-    parser.add_argument("-r", "--referencefile",
+    parser.add_argument("-r", "--referencefile", nargs="+",
                         help="file containing reference "\
                              "set.  Defaults to /gpfs/"\
                              "scratch/mjw5407/task1/ref/"\
-                             "m.{NOBJ}_{EPS}.ref"
+                             "m.{NOBJ}_{EPS}.ref.  Give "\
+                             "several to get a set of "\
+                             "metric columns for each "\
+                             "from one pass over the sets."
                        )
     parser.add_argument("-d", "--setsdirectory",
                         help="directory where solution "\
@@ -65,9 +107,12 @@ def get_args():
                              "{NOBJ}_{EPS}"
                        )
     parser.add_argument("-o", "--outputfile",
-                        type=argparse.FileType("w"),
                         help="file where hypervolume "\
-                             "results are stored"\
+                             "results are stored.  "\
+                             "Opened only when the "\
+                             "results are written, so a "\
+                             "shard that doesn't finish "\
+                             "the job leaves it alone.  "\
                              "Defaults to /gpfs/scratch/"\
                              "mjw5407/task1/hv/{ALGO}_"\
                              "{NDV}_{NOBJ}_{EPS}.hv"
@@ -85,6 +130,68 @@ def get_args():
                              "working directory.  User "\
                              "must patch up the aggregate "\
                              "file manually.")
+    parser.add_argument("-e", "--engine",
+                        choices = ["java", "native"],
+                        default = "java",
+                        help="compute metrics with MOEA"\
+                             "Framework's ResultFile"\
+                             "Evaluator (one JVM per seed) "\
+                             "or in process with "\
+                             "hypervolume.py")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="evaluate seeds concurrently "\
+                             "with this many worker "\
+                             "processes.  Each seed's "\
+                             "result is left in the working "\
+                             "directory as with --seed, and "\
+                             "seeds already there for the "\
+                             "same reference sets and "\
+                             "engine are not recomputed.")
+    parser.add_argument("-c", "--cachedirectory",
+                        help="where metrics are cached, "\
+                             "keyed by the contents of the "\
+                             "sets and reference files.  "\
+                             "Defaults to the cache "\
+                             "subdirectory of the working "\
+                             "directory.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither use nor update the "\
+                             "metrics cache")
+    parser.add_argument("--shard", type=int,
+                        help="evaluate only every SHARDSth "\
+                             "seed, starting with this one "\
+                             "(counting from 0), leaving "\
+                             "results in the working "\
+                             "directory as --jobs does.  "\
+                             "Completed shards are recorded "\
+                             "in a manifest there, and the "\
+                             "last to finish writes the "\
+                             "output file.")
+    parser.add_argument("--shards", type=int,
+                        help="number of shards, for --shard")
+    parser.add_argument("-m", "--hypervolume-method",
+                        choices = ["exact", "montecarlo",
+                                   "both"],
+                        default = "exact",
+                        help="with the native engine, "\
+                             "estimate hypervolume by "\
+                             "Monte-Carlo sampling.  Adds "\
+                             "HypervolumeEstimate, "\
+                             "HypervolumeLower and "\
+                             "HypervolumeUpper (95% "\
+                             "confidence interval) columns. "\
+                             " With montecarlo, Hypervolume "\
+                             "is the estimate; with both, "\
+                             "it is exact.")
+    parser.add_argument("--samples",
+                        type=hypervolume.is_positive,
+                        default=100000,
+                        help="most Monte-Carlo samples per "\
+                             "set (default 100000)")
+    parser.add_argument("--stderr", type=float,
+                        help="stop sampling a set once the "\
+                             "standard error of its "\
+                             "estimate is this small")
 
     return parser.parse_args()
 
@@ -99,6 +206,46 @@ def outputfile(algo, ndv, nobj, eps, seed=None):
     fn = "_".join(fn) + ".hv"
     return os.path.join(dirname, fn)
 
+def seedfilename(workdir, algo, ndv, nobj, eps, seed, key):
+    """
+    Where a single-seed run leaves its result.  The run_key
+    is part of the name, so a result is only ever reused
+    with the reference sets and engine that computed it.
+    """
+    fn = outputfile(algo, ndv, nobj, eps, seed)
+    fn = re.sub("\.hv$", ".{0}.hv".format(key),
+                os.path.basename(fn))
+    return os.path.join(workdir, fn)
+
+def manifestfilename(workdir, algo, ndv, nobj, eps):
+    """
+    Where completed shards are recorded
+    """
+    fn = "_".join([algo, str(ndv), str(nobj), str(eps)])
+    return os.path.join(workdir, fn + ".manifest")
+
+def read_manifest(manifest, shards, key):
+    """
+    Shards recorded as complete, out of this many shards,
+    with the run_key key.  Shards done with other reference
+    sets or another engine still have to be done.
+    """
+    done = set()
+    if not os.path.exists(manifest):
+        return done
+    with open(manifest, "r") as fp:
+        for line in fp:
+            fields = line.split()
+            if len(fields) > 2 and int(fields[1]) == shards \
+                    and fields[2] == key:
+                done.add(int(fields[0]))
+    return done
+
+def record_shard(manifest, shard, shards, key, seeds):
+    with open(manifest, "a") as fp:
+        fp.write("{0} {1} {2} {3}\n".format(
+                    shard, shards, key, ",".join(seeds)))
+
 def referencefilename(nobj, eps):
     return "/gpfs/scratch/mjw5407/task1/ref/"\
            "m.{0}_{1}.ref".format(nobj, eps)
@@ -111,15 +258,20 @@ def workingdirectory(algo, ndv, nobj, eps):
     return "/gpfs/scratch/mjw5407/task1/hv/temp/"\
            "{0}_{1}_{2}_{3}".format(algo, ndv, nobj, eps)
 
-def strip_dvs(ndv, nobj, setsfile, tempfile):
-    awktext = awkscript(ndv, nobj, tempfile)
-    cml = ["awk", awktext, setsfile]
-    print " ".join(cml)
-    child = Popen(cml)
-    child.wait()
-    sedtext = ["sed", "-i", "-e", "/^ *$/d", tempfile]
-    child = Popen(sedtext)
-    child.wait()
+def strip_dvs(ndv, nobj, aset, tempfile):
+    """
+    Write the objectives of aset to tempfile for the Java
+    evaluator, and return the indices of empty sets.
+    """
+    print "stripping {0} to {1}".format(aset, tempfile)
+    empty_sets = []
+    with open(tempfile, "w") as outfp:
+        for index, block in setsstore.load_sets(aset, ndv,
+                                                nobj):
+            if len(block) == 0:
+                empty_sets.append(index)
+            setsfile.write_block(outfp, block)
+    return empty_sets
 
 def classpath():
     cp = ["./lib/{0}".format(fn) for fn in os.listdir("lib") 
@@ -131,8 +283,12 @@ def temp_input_filename(workdir, setsfile):
     fn = "reduced_{0}".format(os.path.basename(setsfile))
     return os.path.join(workdir, fn)
 
-def temp_output_filename(workdir, setsfile):
-    fn = "hyper_{0}".format(os.path.basename(setsfile))
+def temp_output_filename(workdir, setsfile, index=0):
+    if index == 0:
+        fn = "hyper_{0}".format(os.path.basename(setsfile))
+    else:
+        fn = "hyper_{0}_{1}".format(
+                index, os.path.basename(setsfile))
     return os.path.join(workdir, fn)
 
 
@@ -150,83 +306,310 @@ def commandline(nobj, ref, tempin, tempout):
             ])
     return cml
 
-def write_seed(outfp, infp, seed, empty_sets):
-    header = infp.readline()
-    line = infp.readline()
+def write_seed(outfp, infps, seed, empty_sets):
+    """
+    infps: ResultFileEvaluator output, one file per
+    reference set.  Their rows are written side by side.
+    """
+    for infp in infps:
+        header = infp.readline()
+    lines = [infp.readline() for infp in infps]
     counter = 0
-    emptymetrics = "0.0 Inf Inf 0.0 Inf Inf"
-    while line:
+    emptymetrics = " ".join(["0.0 Inf Inf 0.0 Inf Inf"]
+                            * len(infps))
+    while all(lines):
         while counter in empty_sets:
             outfp.write("{0} {1} {2}\n".format(
                         seed, counter, emptymetrics))
             counter += 1
 
-        outfp.write("{0} {1} {2}".format(
-                   seed, counter, line))
+        outfp.write("{0} {1} {2}\n".format(
+                   seed, counter,
+                   " ".join([line.strip() for line in lines])))
         counter += 1
-        line = infp.readline()
-        
-
-def evaluate_sets(ref, sets, outfp, workdir, ndv, nobj):
-    outfp.write("Seed Set "\
-                "Hypervolume GenerationalDistance "\
-                "InvertedGenerationalDistance Spacing "\
-                "EpsilonIndicator MaximumParetoFrontError\n"
-               )
-    temp_inputs = []
-    temp_outputs = []
-
-    for aset in sets:
-        tempin = temp_input_filename(workdir, aset)
-        tempout = temp_output_filename(workdir, aset)
-        temp_inputs.append(tempin)
-        temp_outputs.append(tempout)
-        if os.path.exists(tempin):
-            print "{0} already exists, skipping awk".format(
-                   tempin)
-        else:
-            strip_dvs(ndv, nobj, aset, tempin)
+        lines = [infp.readline() for infp in infps]
+
+def seed_number(aset):
+    seed = aset.split("_")[-1]
+    return seed.split(".")[0]
+
+def load_reference(ref, nobj, cache={}):
+    """
+    Read a reference set once per process.
+    """
+    key = (ref, nobj)
+    if key not in cache:
+        cache[key] = hypervolume.read_reference(ref, nobj)
+    return cache[key]
+
+def write_native_seed(outfp, sets, seed, references,
+                      montecarlo=None):
+    """
+    sets: (index, approximation) pairs, as from
+    setsstore.load_sets
+    """
+    for index, approximation in sets:
+        metrics = hypervolume.evaluate(approximation,
+                                       references, montecarlo)
+        outfp.write("{0} {1} {2}\n".format(
+                    seed, index,
+                    " ".join([hypervolume.format_metrics(row)
+                              for row in metrics])))
+
+def engine_version(engine, montecarlo=None):
+    """
+    Identifies everything that could change the numbers an
+    engine computes.
+    """
+    if engine == "native":
+        version = "native-{0}".format(hypervolume.VERSION)
+        if montecarlo is not None:
+            version += "-" + montecarlo.version()
+        return version
+    jars = sorted([os.path.basename(jar)
+                   for jar in classpath()])
+    return "java-{0}".format(",".join(jars))
+
+def run_key(refs, engine, montecarlo=None):
+    """
+    Identifies everything that could change a seed's
+    result file: the contents of the reference sets, in
+    column order, and the engine version.
+    """
+    fields = [hvcache.digest(ref) for ref in refs]
+    fields.append(engine_version(engine, montecarlo))
+    return hashlib.sha1(" ".join(fields)).hexdigest()
+
+def evaluate_file(outfp, refs, aset, seed, workdir, ndv, nobj,
+                  engine, montecarlo=None, reuse=True):
+    """
+    Write metrics rows for one sets file.  Return the
+    temporary files used, if any.  With reuse, a reduced
+    file already in workdir is evaluated rather than
+    stripped again.
+    """
+    if engine == "native":
+        # no temporary files: parse and evaluate in one go
+        references = [load_reference(ref, nobj)
+                      for ref in refs]
+        write_native_seed(outfp,
+                          setsstore.load_sets(aset, ndv, nobj),
+                          seed, references, montecarlo)
+        return []
+
+    tempin = temp_input_filename(workdir, aset)
+    tempouts = [temp_output_filename(workdir, aset, ii)
+                for ii in range(len(refs))]
+    if reuse and os.path.exists(tempin):
+        print "{0} already exists, not stripping".format(
+               tempin)
+        # the empty sets of what is evaluated, not of aset
+        with open(tempin, "r") as infp:
+            empty_sets = setsfile.find_empty_sets(infp, 0,
+                                                  nobj)[0]
+    else:
+        empty_sets = strip_dvs(ndv, nobj, aset, tempin)
 
+    # one JVM per reference set, all reading the same input
+    children = []
+    for ref, tempout in zip(refs, tempouts):
         cml = commandline(nobj, ref, tempin, tempout)
         print " ".join(cml)
-        child = Popen(cml)
-        with open(tempin, 'r') as ifp:
-            empty_sets, _ = find_empty_sets(ifp)
+        children.append(Popen(cml))
+    for child in children:
         child.wait()
-        seed = aset.split("_")[-1]
-        seed = seed.split(".")[0]
-        with open(tempout, "r") as infp:
-            write_seed(outfp, infp, seed, empty_sets)
-
-    return temp_inputs, temp_outputs
-
-def cleanup(temp_inputs, temp_outputs): 
-    for tempin in temp_inputs:
-        try:
-            os.unlink(tempin)
-        except OSError:
-            pass
-    for tempout in temp_outputs:
+    infps = [open(tempout, "r") for tempout in tempouts]
+    try:
+        write_seed(outfp, infps, seed, empty_sets)
+    finally:
+        for infp in infps:
+            infp.close()
+    return [tempin] + tempouts
+
+def evaluate_cached(outfp, cache, refs, aset, seed, workdir,
+                    ndv, nobj, engine, montecarlo=None):
+    """
+    Like evaluate_file, but only if the cache doesn't
+    already have the rows.  A reduced file left in workdir
+    may not be from these sets, so it is never reused for
+    rows that go in the cache.
+    """
+    key = cache.key(aset, refs, ndv, nobj,
+                    engine_version(engine, montecarlo))
+    rows = cache.get(key)
+    temps = []
+    if rows is None:
+        buf = StringIO.StringIO()
+        temps = evaluate_file(buf, refs, aset, seed, workdir,
+                              ndv, nobj, engine, montecarlo,
+                              reuse=False)
+        rows = [line.split(" ", 1)[1] for line
+                in buf.getvalue().splitlines(True)]
+        cache.put(key, rows)
+    else:
+        print "{0} is cached".format(aset)
+    for row in rows:
+        outfp.write("{0} {1}".format(seed, row))
+    return temps
+
+def evaluate_sets(refs, sets, outfp, workdir, ndv, nobj,
+                  engine="java", cache=None, montecarlo=None):
+    """
+    refs: reference set files, each getting its own metric
+    columns.
+    montecarlo: a hypervolume.MonteCarlo, for the native
+    engine only
+    """
+    outfp.write(header(refs, montecarlo))
+    temp_files = []
+    for aset in sets:
+        seed = seed_number(aset)
+        if cache is None:
+            temps = evaluate_file(outfp, refs, aset, seed,
+                                  workdir, ndv, nobj, engine,
+                                  montecarlo)
+        else:
+            temps = evaluate_cached(outfp, cache, refs, aset,
+                                    seed, workdir, ndv, nobj,
+                                    engine, montecarlo)
+        temp_files.extend(temps)
+
+    return temp_files
+
+def evaluate_seed(task):
+    """
+    Worker for evaluate_parallel.  Write one seed's result
+    to seedfn, as a --seed run would, unless it is already
+    there.
+    """
+    refs, aset, seedfn, workdir, ndv, nobj, engine, cache, \
+        montecarlo = task
+    if os.path.exists(seedfn):
+        print "{0} already exists, reusing it".format(seedfn)
+        return seedfn
+    partial = "{0}.partial".format(seedfn)
+    with open(partial, "w") as outfp:
+        temps = evaluate_sets(refs, [aset], outfp, workdir,
+                              ndv, nobj, engine, cache,
+                              montecarlo)
+    cleanup(temps)
+    # only complete results are ever reused
+    os.rename(partial, seedfn)
+    return seedfn
+
+def assemble(outfp, seedfns, columns):
+    """
+    Concatenate single-seed results under one header,
+    which each of them must share.
+    """
+    outfp.write(columns)
+    for seedfn in seedfns:
+        with open(seedfn, "r") as infp:
+            if infp.readline() != columns:
+                msg = "{0} does not have the columns {1}"\
+                      .format(seedfn, columns.strip())
+                raise SeedError(msg)
+            for line in infp:
+                outfp.write(line)
+
+def evaluate_seeds(refs, sets, seedfns, workdir, ndv, nobj,
+                   engine, jobs=None, cache=None,
+                   montecarlo=None):
+    """
+    Leave each seed's result in its seedfn, in a pool of
+    worker processes if jobs is given.
+    """
+    tasks = [(refs, aset, seedfn, workdir, ndv, nobj, engine,
+              cache, montecarlo)
+             for aset, seedfn in zip(sets, seedfns)]
+    if not jobs:
+        return [evaluate_seed(task) for task in tasks]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        done = pool.map(evaluate_seed, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return done
+
+def evaluate_parallel(refs, sets, seedfns, outfp, workdir,
+                      ndv, nobj, engine, jobs, cache=None,
+                      montecarlo=None):
+    """
+    Evaluate every seed in a pool of worker processes and
+    aggregate the results in the order given by sets.
+    """
+    done = evaluate_seeds(refs, sets, seedfns, workdir, ndv,
+                          nobj, engine, jobs, cache, montecarlo)
+    assemble(outfp, done, header(refs, montecarlo))
+    return done
+
+def evaluate_shard(refs, sets, seedfns, shard, shards, manifest,
+                   key, outputfn, workdir, ndv, nobj, engine,
+                   jobs=None, cache=None, montecarlo=None):
+    """
+    Evaluate every shards-th seed starting with shard, and
+    record it in the manifest under key, the run_key that
+    names seedfns.  If that completes every shard, write
+    outputfn.  Seed results stay in the working directory,
+    since other shards may still be reading them.
+    """
+    evaluate_seeds(refs, sets[shard::shards],
+                   seedfns[shard::shards], workdir, ndv, nobj,
+                   engine, jobs, cache, montecarlo)
+    record_shard(manifest, shard, shards, key,
+                 [seed_number(aset)
+                  for aset in sets[shard::shards]])
+    missing = set(range(shards)) \
+            - read_manifest(manifest, shards, key)
+    if missing:
+        print "shards {0} are still to do".format(
+                " ".join([str(ii) for ii in sorted(missing)]))
+        return
+    if not all([os.path.exists(fn) for fn in seedfns]):
+        print "some seeds were added since sharding, "\
+              "not writing {0}".format(outputfn)
+        return
+    # any shard may get here, so write atomically
+    partial = "{0}.{1}.partial".format(outputfn, os.getpid())
+    with open(partial, "w") as outfp:
+        assemble(outfp, seedfns, header(refs, montecarlo))
+    os.rename(partial, outputfn)
+    print "all shards done, wrote {0}".format(outputfn)
+
+def cleanup(temp_files):
+    for tempfile in temp_files:
         try:
-            os.unlink(tempout)
+            os.unlink(tempfile)
         except OSError:
             pass
 
 def cli():
     args = get_args()
+    if args.hypervolume_method == "exact":
+        montecarlo = None
+    elif args.engine != "native":
+        msg = "--hypervolume-method {0} needs --engine "\
+              "native".format(args.hypervolume_method)
+        raise EngineError(msg)
+    else:
+        montecarlo = hypervolume.MonteCarlo(
+                        args.samples, args.stderr,
+                        exact=args.hypervolume_method == "both")
     if args.referencefile:
-        ref = args.referencefile
+        refs = args.referencefile
     else:
-        ref = referencefilename(args.nobj, args.eps)
+        refs = [referencefilename(args.nobj, args.eps)]
     if args.setsdirectory:
         setsdir = args.setsdirectory
     else:
         setsdir = setsdirectory(args.algo, args.ndv, 
                                 args.nobj, args.eps)
-    sets = glob.glob(os.path.join(setsdir, "*sets"))
+    sets = setsstore.find_sets(setsdir)
     if args.seed is not None:
         sets = [aset for aset in sets if re.search(
-                "_{0}.sets".format(args.seed), aset)]
+                "_{0}\.(sets|store)$".format(args.seed), aset)]
+    sets.sort(key=lambda aset: int(seed_number(aset)))
 
     print "sets {0}".format("\n".join(sets))
     if args.workingdirectory:
@@ -238,8 +621,41 @@ def cli():
     if not os.path.exists(workdir):
         os.makedirs(workdir)
 
+    if args.no_cache:
+        cache = None
+    elif args.cachedirectory:
+        cache = hvcache.MetricsCache(args.cachedirectory)
+    else:
+        cache = hvcache.MetricsCache(
+                    os.path.join(workdir, "cache"))
+    key = run_key(refs, args.engine, montecarlo)
+
+    if args.shard is not None:
+        if not 0 <= args.shard < (args.shards or 1):
+            msg = "shard {0} is not among shards 0 to {1}"\
+                  .format(args.shard, (args.shards or 1) - 1)
+            raise ShardError(msg)
+        if args.outputfile:
+            outputfn = args.outputfile
+        else:
+            outputfn = outputfile(args.algo, args.ndv,
+                                  args.nobj, args.eps)
+        seedfns = [seedfilename(workdir, args.algo, args.ndv,
+                                args.nobj, args.eps,
+                                seed_number(aset), key)
+                   for aset in sets]
+        manifest = manifestfilename(workdir, args.algo,
+                                    args.ndv, args.nobj,
+                                    args.eps)
+        evaluate_shard(refs, sets, seedfns, args.shard,
+                       args.shards or 1, manifest, key,
+                       outputfn, workdir, args.ndv, args.nobj,
+                       args.engine, args.jobs, cache,
+                       montecarlo)
+        return
+
     if args.outputfile:
-        outfp = args.outputfile
+        outfp = open(args.outputfile, "w")
     elif args.seed is None:
         fn = outputfile(args.algo, args.ndv, 
                         args.nobj, args.eps)
@@ -249,18 +665,34 @@ def cli():
             raise PathError(msg)
         outfp = open(fn, "w")
     else:
-        fn = outputfile(args.algo, args.ndv, 
-                        args.nobj, args.eps, args.seed)
+        fn = seedfilename(workdir, args.algo, args.ndv,
+                          args.nobj, args.eps, args.seed, key)
         if os.path.exists(fn):
             msg = "{0} exists, specify explicitly to "\
                   "clobber".format(fn)
             raise PathError(msg)
+        print "writing {0}".format(fn)
         outfp = open(fn, "w")
     try:
-        tin, tout = evaluate_sets(ref, sets, outfp, workdir,
-                                  args.ndv, args.nobj)
-        if args.seed is None:# one-seed run leaves working files
-            cleanup(tin, tout)
+        if args.jobs and args.seed is None:
+            seedfns = [seedfilename(workdir, args.algo,
+                                    args.ndv, args.nobj,
+                                    args.eps,
+                                    seed_number(aset), key)
+                       for aset in sets]
+            done = evaluate_parallel(refs, sets, seedfns, outfp,
+                                     workdir, args.ndv,
+                                     args.nobj, args.engine,
+                                     args.jobs, cache,
+                                     montecarlo)
+            cleanup(done)
+        else:
+            temps = evaluate_sets(refs, sets, outfp, workdir,
+                                  args.ndv, args.nobj,
+                                  args.engine, cache,
+                                  montecarlo)
+            if args.seed is None:# one-seed run leaves files
+                cleanup(temps)
     finally:
         outfp.close()
 
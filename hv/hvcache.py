@@ -0,0 +1,123 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+
+hvcache.py
+
+A persistent cache of metrics, one file of per-set rows for
+every sets file evaluated.  Entries are keyed by the
+contents of the sets file and of the reference set, the
+numbers of decision variables and objectives, and the
+metric engine and its version, so any change to an input is a cache miss and
+nothing stale is ever reused.
+
+If invoked at the command line, report what is cached.
+"""
+import os
+import hashlib
+import argparse
+
+def digest(filename, blocksize=2**20, memo={}):
+    """
+    SHA-1 of a file's contents.  Remembered for as long as
+    the file's size and modification time don't change.
+    A directory, such as a sets store, is digested file by
+    file.
+    """
+    if os.path.isdir(filename):
+        names = sorted(os.listdir(filename))
+        fields = ["{0} {1}".format(name, digest(
+                    os.path.join(filename, name), blocksize))
+                  for name in names]
+        return hashlib.sha1(" ".join(fields)).hexdigest()
+    stat = os.stat(filename)
+    stamp = (os.path.abspath(filename), stat.st_size,
+             stat.st_mtime)
+    if stamp not in memo:
+        sha = hashlib.sha1()
+        with open(filename, "rb") as fp:
+            block = fp.read(blocksize)
+            while block:
+                sha.update(block)
+                block = fp.read(blocksize)
+        memo[stamp] = sha.hexdigest()
+    return memo[stamp]
+
+class MetricsCache(object):
+    """
+    Rows are stored without the seed column, since the same
+    contents could turn up under any seed number.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError: # another worker got there first
+                pass
+
+    def key(self, setsfile, reffiles, ndv, nobj, version):
+        """
+        reffiles: every reference set the rows are
+        computed against, in column order
+        """
+        fields = [digest(setsfile)]
+        fields.extend([digest(fn) for fn in reffiles])
+        fields.extend([str(ndv), str(nobj), version])
+        return hashlib.sha1(" ".join(fields)).hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.directory,
+                            "{0}.rows".format(key))
+
+    def get(self, key):
+        """
+        Cached rows, or None.
+        """
+        fn = self.filename(key)
+        if not os.path.exists(fn):
+            return None
+        with open(fn, "r") as fp:
+            return fp.readlines()
+
+    def put(self, key, rows):
+        fn = self.filename(key)
+        partial = "{0}.{1}.partial".format(fn, os.getpid())
+        with open(partial, "w") as fp:
+            fp.writelines(rows)
+        os.rename(partial, fn)
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory",
+                        help="cache directory")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    entries = [fn for fn in os.listdir(args.directory)
+               if fn.endswith(".rows")]
+    size = sum([os.path.getsize(
+                    os.path.join(args.directory, fn))
+                for fn in entries])
+    print "{0}: {1} entries, {2} bytes".format(
+            args.directory, len(entries), size)
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
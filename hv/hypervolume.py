@@ -0,0 +1,439 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+
+hypervolume.py
+
+Compute the metrics that MOEAFramework's ResultFileEvaluator
+reports, in process, without starting a JVM:
+Hypervolume, GenerationalDistance,
+InvertedGenerationalDistance, Spacing, EpsilonIndicator,
+and MaximumParetoFrontError.
+
+Conventions follow MOEAFramework:
+- Reference sets and approximation sets are reduced to
+  their nondominated members first.
+- Every metric except Spacing is computed on objectives
+  normalized to the bounds of the reference set.
+- Hypervolume is measured against (1, 1, ..., 1) in
+  normalized space.  Points outside that box are dropped.
+- Spacing uses Manhattan distance on raw objectives.
+
+Hypervolume is exact.  It uses the WFG algorithm (While,
+Bradstreet and Barone 2012) with its dimension-slicing
+trick, bottoming out in a sweep at two objectives, so three
+objectives cost one 2-d sweep per point.  In ten
+objectives that is still slow, so a Monte-Carlo estimate
+with a confidence interval can be reported alongside it, or
+in place of it.
+
+If invoked at the command line, evaluate a file of
+approximation sets and print one row of metrics per set,
+for comparison with ResultFileEvaluator output.
+"""
+import argparse
+import math
+import numpy
+from setsstore import load_sets
+from nondominated import nondominated
+
+# Bump this whenever a change would alter computed metrics.
+VERSION = "1"
+
+METRICS = ["Hypervolume", "GenerationalDistance",
+           "InvertedGenerationalDistance", "Spacing",
+           "EpsilonIndicator", "MaximumParetoFrontError"]
+
+# Columns added after Hypervolume by a Monte-Carlo estimate
+ESTIMATES = ["HypervolumeEstimate", "HypervolumeLower",
+             "HypervolumeUpper"]
+
+# What write_seed reports for an empty approximation set
+EMPTY = (0.0, float("inf"), float("inf"),
+         0.0, float("inf"), float("inf"))
+
+# Two-sided 95% normal quantile
+Z95 = 1.959963984540054
+
+# Upper bound on elements in any temporary array
+BLOCK = 2 ** 22
+
+class DegenerateReferenceSetError(Exception):
+    pass
+
+def _blocksize(*dims):
+    return max(1, BLOCK // max(1, numpy.prod(dims)))
+
+def _sweep(points, ref):
+    """
+    Exact two-objective hypervolume.  Dominated points are
+    harmless.
+    """
+    order = numpy.argsort(points[:, 0], kind="mergesort")
+    xx = points[order, 0]
+    yy = numpy.minimum.accumulate(points[order, 1])
+    widths = numpy.diff(numpy.append(xx, ref[0]))
+    return float((widths * (ref[1] - yy)).sum())
+
+def _wfg(points, ref):
+    """
+    Exact hypervolume of nondominated points, all of which
+    dominate ref.
+    """
+    nobj = points.shape[1]
+    if len(points) == 0:
+        return 0.0
+    if len(points) == 1:
+        return float(numpy.prod(ref - points[0]))
+    if len(points) == 2:
+        overlap = numpy.maximum(points[0], points[1])
+        return float(numpy.prod(ref - points[0])
+                   + numpy.prod(ref - points[1])
+                   - numpy.prod(ref - overlap))
+    if nobj == 2:
+        return _sweep(points, ref)
+    # Worst last objective first, so that every limit set
+    # shares the last objective value of its limiting point
+    # and can be measured in one dimension fewer.
+    order = numpy.argsort(-points[:, -1], kind="mergesort")
+    points = points[order]
+    head = points[:, :-1]
+    total = 0.0
+    for kk in range(len(points)):
+        depth = ref[-1] - points[kk, -1]
+        if depth <= 0.0:
+            continue
+        inclusive = numpy.prod(ref[:-1] - head[kk])
+        limited = numpy.maximum(head[kk+1:], head[kk])
+        if nobj > 3 and len(limited) > 1:
+            limited = limited[nondominated(limited)]
+        total += depth * (inclusive - _wfg(limited, ref[:-1]))
+    return float(total)
+
+def hypervolume(points):
+    """
+    Hypervolume of normalized points with respect to the
+    point (1, 1, ..., 1).
+    """
+    if len(points) == 0:
+        return 0.0
+    return _hypervolume(points[nondominated(points)])
+
+def _hypervolume(points):
+    """
+    hypervolume for points already known to be
+    nondominated
+    """
+    points = points[(points <= 1.0).all(1)]
+    return _wfg(points, numpy.ones(points.shape[1]))
+
+def wilson(hits, drawn, z=Z95):
+    """
+    (lower, upper) Wilson score interval for the fraction
+    of drawn samples that hit
+    """
+    fraction = float(hits) / drawn
+    zz = z * z / drawn
+    centre = (fraction + zz / 2.0) / (1.0 + zz)
+    half = z * math.sqrt(fraction * (1.0 - fraction) / drawn
+                         + zz / (4.0 * drawn)) / (1.0 + zz)
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+def is_positive(text):
+    """
+    argparse type for a count of samples
+    """
+    value = int(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(
+                "{0} is not a positive number".format(text))
+    return value
+
+class MonteCarlo(object):
+    """
+    Monte-Carlo hypervolume estimator.  Uniform samples are
+    drawn from the box between the ideal point of the set
+    and (1, 1, ..., 1), and the fraction dominated by the
+    set scales the volume of the box.
+
+    samples: most samples to draw for one set
+    stderr: stop early once the standard error of the
+            estimate is this small
+
+    The confidence interval is Wilson's score interval for
+    the dominated fraction, which, unlike the normal
+    approximation, doesn't shrink to nothing when none or
+    all of the samples are dominated.  The standard error
+    is taken to be its half width over Z95.
+    exact: also compute the exact hypervolume
+    seed: every set is sampled from the same seed, so
+          results are reproducible and cacheable
+    """
+    def __init__(self, samples=100000, stderr=None,
+                 exact=False, seed=0, batch=10000):
+        self.samples = samples
+        self.stderr = stderr
+        self.exact = exact
+        self.seed = seed
+        self.batch = batch
+
+    def version(self):
+        """
+        Identifies everything that changes the estimates.
+        """
+        return "mc-wilson-{0}-{1}-{2}-{3}-{4}".format(
+                self.samples, self.stderr, self.exact,
+                self.seed, self.batch)
+
+    def _dominated(self, points, samples):
+        """
+        Number of samples dominated by at least one point.
+        """
+        count = 0
+        step = _blocksize(len(points), points.shape[1])
+        for start in range(0, len(samples), step):
+            block = samples[start:start+step, numpy.newaxis, :]
+            hits = (points[numpy.newaxis, :, :] <= block).all(2)
+            count += int(hits.any(1).sum())
+        return count
+
+    def estimate(self, points):
+        """
+        (estimate, lower, upper) for normalized,
+        nondominated points.  lower and upper bound a 95%
+        confidence interval.
+        """
+        points = points[(points <= 1.0).all(1)]
+        if len(points) == 0:
+            return (0.0, 0.0, 0.0)
+        ideal = points.min(0)
+        width = 1.0 - ideal
+        box = float(numpy.prod(width))
+        random = numpy.random.RandomState(self.seed)
+        drawn = 0
+        hits = 0
+        while drawn < self.samples:
+            size = min(self.batch, self.samples - drawn)
+            samples = ideal + width * random.random_sample(
+                                (size, points.shape[1]))
+            hits += self._dominated(points, samples)
+            drawn += size
+            lower, upper = wilson(hits, drawn)
+            error = box * (upper - lower) / (2.0 * Z95)
+            if self.stderr is not None \
+                    and error <= self.stderr:
+                break
+        return (box * float(hits) / drawn, box * lower,
+                box * upper)
+
+def metric_names(montecarlo=None):
+    """
+    Column names for the tuples evaluate returns.
+    """
+    if montecarlo is None:
+        return METRICS
+    return METRICS[:1] + ESTIMATES + METRICS[1:]
+
+def empty_metrics(montecarlo=None):
+    """
+    Metrics of an empty approximation set.
+    """
+    if montecarlo is None:
+        return EMPTY
+    return EMPTY[:1] + (0.0, 0.0, 0.0) + EMPTY[1:]
+
+def _nearest(points, others, ord=2):
+    """
+    Distance from each point to the nearest of others.
+    Zero distances to self are excluded when points is others.
+    """
+    result = numpy.empty(len(points))
+    step = _blocksize(len(others), points.shape[1])
+    for start in range(0, len(points), step):
+        diff = points[start:start+step, numpy.newaxis, :] \
+             - others[numpy.newaxis, :, :]
+        if ord == 1:
+            dist = numpy.abs(diff).sum(2)
+        else:
+            dist = (diff ** 2).sum(2)
+        if points is others:
+            rows = numpy.arange(dist.shape[0])
+            dist[rows, rows + start] = numpy.inf
+        result[start:start+step] = dist.min(1)
+    if ord == 1:
+        return result
+    return numpy.sqrt(result)
+
+def generational_distance(normal, refnormal):
+    dist = _nearest(normal, refnormal)
+    return float(numpy.sqrt((dist ** 2).sum()) / len(normal))
+
+def inverted_generational_distance(normal, refnormal):
+    dist = _nearest(refnormal, normal)
+    return float(numpy.sqrt((dist ** 2).sum()) / len(refnormal))
+
+def spacing(points):
+    if len(points) < 2:
+        return 0.0
+    dist = _nearest(points, points, ord=1)
+    return float(numpy.std(dist, ddof=1))
+
+def epsilon_indicator(normal, refnormal):
+    """
+    Additive epsilon indicator.
+    """
+    worst = -numpy.inf
+    step = _blocksize(len(normal), normal.shape[1])
+    for start in range(0, len(refnormal), step):
+        diff = normal[numpy.newaxis, :, :] \
+             - refnormal[start:start+step, numpy.newaxis, :]
+        worst = max(worst, diff.max(2).min(1).max())
+    return float(worst)
+
+def maximum_pareto_front_error(normal, refnormal):
+    return float(_nearest(normal, refnormal).max())
+
+class ReferenceSet(object):
+    """
+    A reference set, its bounds, and its normalized points.
+    """
+    def __init__(self, points):
+        points = numpy.asarray(points, dtype=float)
+        self.points = points[nondominated(points)]
+        self.minimum = self.points.min(0)
+        self.maximum = self.points.max(0)
+        self.scale = self.maximum - self.minimum
+        if (self.scale < 1e-10).any():
+            msg = "reference set is degenerate in objective(s) "\
+                  "{0}".format(numpy.nonzero(
+                                    self.scale < 1e-10)[0])
+            raise DegenerateReferenceSetError(msg)
+        self.normal = self.normalize(self.points)
+
+    def normalize(self, points):
+        return (points - self.minimum) / self.scale
+
+def read_reference(filename, nobj):
+    """
+    Read a reference set.  Objectives are the last nobj
+    columns; lines starting with # are ignored.
+    """
+    points = numpy.loadtxt(filename, comments="#", ndmin=2)
+    return ReferenceSet(points[:, -nobj:])
+
+def prepare(approximation):
+    """
+    Reduce an approximation set to its nondominated points,
+    sorted the way WFG wants them.  Normalization never
+    changes dominance or order, so this is done once no
+    matter how many reference sets are used.
+    """
+    points = numpy.asarray(approximation, dtype=float)
+    points = points[nondominated(points)]
+    order = numpy.argsort(-points[:, -1], kind="mergesort")
+    return points[order]
+
+def _volumes(normal, montecarlo):
+    """
+    Hypervolume, followed by the Monte-Carlo estimate and
+    its bounds if there is one.  Without an exact answer,
+    the estimate stands in for Hypervolume.
+    """
+    if montecarlo is None:
+        return (_hypervolume(normal),)
+    estimate = montecarlo.estimate(normal)
+    if montecarlo.exact:
+        return (_hypervolume(normal),) + estimate
+    return estimate[:1] + estimate
+
+def _metrics(points, reference, montecarlo=None):
+    normal = reference.normalize(points)
+    refnormal = reference.normal
+    return _volumes(normal, montecarlo) + (
+        generational_distance(normal, refnormal),
+        inverted_generational_distance(normal, refnormal),
+        spacing(points),
+        epsilon_indicator(normal, refnormal),
+        maximum_pareto_front_error(normal, refnormal))
+
+def evaluate(approximation, references, montecarlo=None):
+    """
+    Metrics for one approximation set against each of
+    several reference sets: a list of tuples in the order
+    given by metric_names.
+    """
+    if len(approximation) == 0:
+        return [empty_metrics(montecarlo) for _ in references]
+    points = prepare(approximation)
+    return [_metrics(points, reference, montecarlo)
+            for reference in references]
+
+def metrics(approximation, reference):
+    """
+    All six metrics for one approximation set, in the order
+    given by METRICS.
+    """
+    return evaluate(approximation, [reference])[0]
+
+def format_metrics(values):
+    """
+    Space-delimited metrics, with infinities spelled the way
+    write_seed spells them.
+    """
+    text = []
+    for value in values:
+        if numpy.isinf(value):
+            text.append("Inf" if value > 0 else "-Inf")
+        else:
+            text.append(repr(float(value)))
+    return " ".join(text)
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("reference",
+                        help="file containing reference set")
+    parser.add_argument("sets",
+                        help="file or store containing "\
+                             "approximation sets")
+    parser.add_argument("nobj", type=int,
+                        help="number of objectives")
+    parser.add_argument("-n", "--ndv", type=int, default=0,
+                        help="number of decision variables "\
+                             "(default 0, for reduced files)")
+    parser.add_argument("-m", "--montecarlo",
+                        type=is_positive,
+                        help="also estimate hypervolume "\
+                             "from this many samples")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    reference = read_reference(args.reference, args.nobj)
+    montecarlo = None
+    if args.montecarlo:
+        montecarlo = MonteCarlo(args.montecarlo, exact=True)
+    print "#{0}".format(" ".join(metric_names(montecarlo)))
+    for _, approximation in load_sets(args.sets, args.ndv,
+                                      args.nobj):
+        row = evaluate(approximation, [reference],
+                       montecarlo)[0]
+        print format_metrics(row)
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
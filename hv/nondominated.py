@@ -0,0 +1,298 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+
+nondominated.py
+
+Find the nondominated points of a set (minimization), for
+the hypervolume code, for extending reference sets, and for
+checking them.  Of identical points, only the first is kept.
+
+Which method is used depends on the size of the problem:
+- Small sets are compared all against all, in blocks.
+- Two objectives: sort on the first and keep the points
+  that improve on the best second objective so far.
+- Three objectives: sort on the first and sweep, keeping a
+  staircase of the best (second, third) pairs so far.
+- More objectives: sort by the sum of the objectives, so
+  that every point comes after any point that dominates it,
+  and the points most likely to dominate come first.  Then
+  take the points a chunk at a time, check each chunk
+  against the nondominated points found so far, dropping
+  points as soon as they're beaten, and then within itself.
+  The cost grows with the number of points times the size
+  of the front, rather than with the square of the points.
+
+If invoked at the command line, check a reference set (or
+write its nondominated points), or time the methods on
+random points.
+"""
+import sys
+import time
+import bisect
+import argparse
+import numpy
+
+class MethodError(Exception):
+    pass
+
+# Upper bound on elements in any temporary array
+BLOCK = 2 ** 22
+
+# Points taken at a time when sorting by sum
+CHUNK = 1024
+
+def _blocksize(*dims):
+    return max(1, BLOCK // max(1, numpy.prod(dims)))
+
+def pairwise(points):
+    """
+    Boolean mask of the nondominated points, comparing
+    every point with every other.
+    """
+    nrows = len(points)
+    mask = numpy.ones(nrows, dtype=bool)
+    if nrows < 2:
+        return mask
+    order = numpy.arange(nrows)
+    step = _blocksize(nrows, points.shape[1])
+    for start in range(0, nrows, step):
+        block = points[start:start+step, numpy.newaxis, :]
+        noworse = (points[numpy.newaxis, :, :] <= block).all(2)
+        better = (points[numpy.newaxis, :, :] < block).any(2)
+        earlier = order[numpy.newaxis, :] \
+                < order[start:start+step, numpy.newaxis]
+        beaten = noworse & (better | earlier)
+        mask[start:start+step] = ~beaten.any(1)
+    return mask
+
+def lexical_order(points):
+    """
+    Sort order on the first objective, then the second, and
+    so on.  Identical points keep their order.
+    """
+    return numpy.lexsort(points.T[::-1])
+
+def sum_order(points):
+    """
+    Sort order on the sum of the objectives, ties broken as
+    in lexical_order.  A point that dominates another
+    always comes first.
+    """
+    keys = list(points.T[::-1]) + [points.sum(1)]
+    return numpy.lexsort(keys)
+
+def _two(points):
+    """
+    Mask for two-objective points in lexical order
+    """
+    second = points[:, 1]
+    best = numpy.minimum.accumulate(second)
+    before = numpy.append(numpy.inf, best[:-1])
+    return second < before
+
+def _three(points):
+    """
+    Mask for three-objective points in lexical order.  Each
+    point is beaten if some earlier survivor is no worse in
+    the second and third objectives.
+    """
+    mask = numpy.zeros(len(points), dtype=bool)
+    kept = []
+    # staircase: seconds increasing, thirds decreasing
+    seconds = []
+    thirds = []
+    for index, (second, third) in enumerate(
+                    zip(points[:, 1].tolist(),
+                        points[:, 2].tolist())):
+        pos = bisect.bisect_right(seconds, second)
+        if pos > 0 and thirds[pos - 1] <= third:
+            continue
+        kept.append(index)
+        start = pos
+        if start > 0 and seconds[start - 1] == second:
+            start -= 1
+        end = pos
+        while end < len(thirds) and thirds[end] >= third:
+            end += 1
+        seconds[start:end] = [second]
+        thirds[start:end] = [third]
+    mask[kept] = True
+    return mask
+
+def _chunked(points):
+    """
+    Mask for points in sum order
+    """
+    nrows, nobj = points.shape
+    mask = numpy.zeros(nrows, dtype=bool)
+    front = numpy.empty((nrows, nobj))
+    nfront = 0
+    for start in range(0, nrows, CHUNK):
+        block = points[start:start+CHUNK]
+        alive = numpy.arange(len(block))
+        done = 0
+        while done < nfront and len(alive):
+            step = _blocksize(len(alive), nobj)
+            stop = min(done + step, nfront)
+            against = front[numpy.newaxis, done:stop]
+            beaten = (against <= block[alive, numpy.newaxis]
+                      ).all(2).any(1)
+            alive = alive[~beaten]
+            done = stop
+        # within the chunk, earlier points beat later ones
+        candidates = block[alive]
+        noworse = (candidates[numpy.newaxis, :, :]
+                   <= candidates[:, numpy.newaxis, :]).all(2)
+        earlier = numpy.tri(len(alive), k=-1, dtype=bool)
+        alive = alive[~(noworse & earlier).any(1)]
+        mask[alive + start] = True
+        front[nfront:nfront + len(alive)] = block[alive]
+        nfront += len(alive)
+    return mask
+
+def nondominated(points, method=None):
+    """
+    Boolean mask of the points not dominated by any other
+    point (minimization).  Of identical points, only the
+    first is kept.  method is one of "pairwise", "sweep"
+    (two or three objectives) or "chunked"; by default the
+    fastest for the problem is used.
+    """
+    points = numpy.asarray(points, dtype=float)
+    nrows = len(points)
+    if nrows < 2:
+        return numpy.ones(nrows, dtype=bool)
+    nobj = points.shape[1]
+    if method is None:
+        if nrows * nrows * nobj <= BLOCK:
+            method = "pairwise"
+        elif nobj in (2, 3):
+            method = "sweep"
+        else:
+            method = "chunked"
+    if method == "pairwise":
+        return pairwise(points)
+    if method == "sweep":
+        order = lexical_order(points)
+        if nobj == 2:
+            sorted_mask = _two(points[order])
+        elif nobj == 3:
+            sorted_mask = _three(points[order])
+        else:
+            msg = "sweep needs two or three objectives"
+            raise MethodError(msg)
+    elif method == "chunked":
+        order = sum_order(points)
+        sorted_mask = _chunked(points[order])
+    else:
+        raise MethodError("unknown method {0}".format(method))
+    mask = numpy.empty(nrows, dtype=bool)
+    mask[order] = sorted_mask
+    return mask
+
+def sample(nrows, nobj, seed=0):
+    """
+    Random points for timing, uniform in the unit cube
+    """
+    random = numpy.random.RandomState(seed)
+    return random.uniform(size=(nrows, nobj))
+
+def benchmark(sizes, objectives, methods, limit):
+    """
+    Time each method on sample points.  Methods whose
+    all-against-all comparison would exceed limit elements
+    are skipped for larger sizes.
+    """
+    print "nobj rows method seconds nondominated"
+    for nobj in objectives:
+        for nrows in sizes:
+            points = sample(nrows, nobj)
+            expected = None
+            for method in methods:
+                if method == "sweep" and nobj not in (2, 3):
+                    continue
+                if method == "pairwise" \
+                        and nrows * nrows * nobj > limit:
+                    continue
+                start = time.time()
+                mask = nondominated(points, method)
+                elapsed = time.time() - start
+                if expected is not None \
+                        and (mask != expected).any():
+                    print "{0} disagrees".format(method)
+                expected = mask
+                print "{0} {1} {2} {3:.3f} {4}".format(
+                        nobj, nrows, method, elapsed, mask.sum())
+                sys.stdout.flush()
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("refset", nargs="?",
+                        help="reference set to check")
+    parser.add_argument("-m", "--nobj", type=int,
+                        help="number of objectives, the last "\
+                             "columns of each row")
+    parser.add_argument("-o", "--output",
+                        type=argparse.FileType("w"),
+                        help="write the nondominated rows here")
+    parser.add_argument("-b", "--benchmark", action="store_true",
+                        help="time the methods instead")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="with --benchmark, comma-separated "\
+                             "numbers of points")
+    parser.add_argument("--objectives", default="3,10",
+                        help="with --benchmark, comma-separated "\
+                             "numbers of objectives")
+    parser.add_argument("--methods", default="pairwise,sweep,"\
+                                             "chunked",
+                        help="with --benchmark, methods to time")
+    parser.add_argument("--limit", type=float, default=1e10,
+                        help="with --benchmark, skip pairwise "\
+                             "once rows * rows * nobj exceeds "\
+                             "this")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    if args.benchmark:
+        benchmark([int(size) for size in args.sizes.split(",")],
+                  [int(nobj) for nobj
+                   in args.objectives.split(",")],
+                  args.methods.split(","), args.limit)
+        return
+    if args.refset is None or args.nobj is None:
+        print "Specify a reference set and --nobj, or --benchmark"
+        return
+    with open(args.refset, "r") as fp:
+        lines = [line for line in fp
+                 if line.strip() and not line.startswith("#")]
+    rows = numpy.array([line.split()[-args.nobj:]
+                        for line in lines], dtype=float)
+    mask = nondominated(rows.reshape(-1, args.nobj))
+    print "{0}: {1} rows, {2} dominated or repeated".format(
+            args.refset, len(mask), (~mask).sum())
+    if args.output:
+        for line, keep in zip(lines, mask):
+            if keep:
+                args.output.write(line)
+        args.output.close()
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
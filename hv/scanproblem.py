@@ -22,8 +22,10 @@ points based on those sets.
 
 """
 import bestandworst
+import setsstore
 import argparse
 import glob
+import multiprocessing
 import os
 import sys
 
@@ -39,9 +41,28 @@ def get_args():
                         help = "defaults to stdout",
                         type = argparse.FileType("a"),
                         default = sys.stdout)
+    parser.add_argument("-j", "--jobs", type = int,
+                        help = "scan this many files at once "\
+                               "(default one per CPU)")
     return parser.parse_args()
                         
-def scan_problem(problem, dirname):
+def scan_file(task):
+    """
+    Best and worst objectives in one sets file.  A worker
+    for scan_problem.
+    """
+    setsfile, first, last = task
+    if setsstore.is_store(setsfile):
+        objectives = setsstore.SetsStore(setsfile).objectives
+        if len(objectives) == 0:
+            return setsfile, None, None
+        return (setsfile, objectives.min(0).tolist(),
+                objectives.max(0).tolist())
+    with open(setsfile, "r") as fp:
+        best, worst = bestandworst.scan(fp, first, last)
+    return setsfile, best, worst
+
+def scan_problem(problem, dirname, jobs=None):
     ndvs, nobjs, _ = problem.split("_")
     ndvs = int(ndvs)
     nobjs = int(nobjs)
@@ -49,19 +70,23 @@ def scan_problem(problem, dirname):
     last = ndvs + nobjs - 1
     setsdirs = glob.glob(os.path.join(dirname, 
                                        "*{0}".format(problem)))
+    tasks = [(setsfile, first, last)
+             for setsdir in setsdirs
+             for setsfile in setsstore.find_sets(setsdir)]
     globalbest = None
     globalworst = None
-    for setsdir in setsdirs:
-        setsfiles = glob.glob(os.path.join(setsdir, "*sets"))
-        for setsfile in setsfiles:
+    pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.imap_unordered(scan_file, tasks)
+        for setsfile, best, worst in results:
             sys.stderr.write(setsfile)
             sys.stderr.write("\n")
-            with open(setsfile, "r") as fp:
-                best, worst = bestandworst.scan(fp, first, last)
             sys.stderr.write("{0}".format(best))
             sys.stderr.write("\n")
             sys.stderr.write("{0}".format(worst))
             sys.stderr.write("\n")
+            if best is None: # no complete sets yet
+                continue
 
             if globalbest is None:
                 globalbest = best
@@ -71,11 +96,15 @@ def scan_problem(problem, dirname):
                               in zip(best, globalbest)]
                 globalworst = [max(a,b) for a, b 
                                in zip(worst, globalworst)]
+    finally:
+        pool.close()
+        pool.join()
     return globalbest, globalworst
     
 def cli():
     args = get_args()
-    best, worst = scan_problem(args.problem, args.sets_directory)
+    best, worst = scan_problem(args.problem, args.sets_directory,
+                               args.jobs)
     args.output.write(args.problem)
     args.output.write(" ")
     args.output.write(",".join([str(val) for val in best]))
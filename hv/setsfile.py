@@ -0,0 +1,211 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+
+setsfile.py
+
+Read a MOEAFramework sets file in a single pass, yielding
+one NumPy block of objectives per approximation set.  This
+does the work of the reduce_refset awk script, the sed
+cleanup, and emptysets.find_empty_sets at once, without
+writing a reduced file.
+
+A set is terminated by a line containing only #.  Header
+lines (# Variables = 27) and property lines
+(//EvaluationTime=...) are skipped.  A trailing set with no
+terminator is still being written and is not reported,
+which is also what MOEAFramework does.
+
+When set boundaries don't matter, read_blocks parses many
+sets at a time, a few megabytes of text per NumPy call.
+
+If invoked at the command line, write the reduced file that
+the awk script would have written.
+"""
+import re
+import sys
+import argparse
+import numpy
+
+# Rows of plain numbers.  Like the awk script, this skips
+# rows containing NaN or Infinity.
+DATA = re.compile("^[-0-9.][-+0-9.eE \t]*$")
+SEPARATOR = re.compile("^# *$")
+# First characters of data lines, and all of their characters
+LEADING = "-0123456789."
+NUMERIC = "-+0123456789.eE \t\n"
+
+def _uniform(text, ncols):
+    """
+    Whether every line of text has ncols fields.  Counts
+    the starts of fields with NumPy rather than splitting
+    each line.
+    """
+    chars = numpy.frombuffer(text, dtype=numpy.uint8)
+    blank = (chars == ord(" ")) | (chars == ord("\t")) \
+          | (chars == ord("\n"))
+    starts = ~blank
+    starts[1:] &= blank[:-1]
+    stops = numpy.flatnonzero(chars == ord("\n"))
+    if not text.endswith("\n"):
+        stops = numpy.append(stops, len(chars) - 1)
+    before = numpy.cumsum(starts)[stops]
+    counts = numpy.diff(numpy.concatenate([[0], before]))
+    return bool((counts == ncols).all())
+
+def _block(lines, ndv, nobj, variables):
+    """
+    Parse the data lines of one set.  Short rows are dropped.
+    """
+    first = ndv
+    if variables:
+        first = 0
+    width = ndv + nobj
+    if not lines:
+        return numpy.empty((0, width - first))
+    ncols = len(lines[0].split())
+    text = "".join(lines)
+    values = numpy.fromstring(text, sep=" ")
+    if ncols >= width and values.size == ncols * len(lines) \
+            and _uniform(text, ncols):
+        values = values.reshape(len(lines), ncols)
+    else:
+        rows = [line.split() for line in lines]
+        rows = [row[:width] for row in rows if len(row) >= width]
+        values = numpy.array(rows, dtype=float).reshape(-1, width)
+    return values[:, first:width]
+
+def read_sets(stream, ndv, nobj, variables=False):
+    """
+    Yield (index, block) for every complete set in stream.
+    block has one row per solution and nobj columns of
+    objectives, or ndv + nobj columns if variables is True.
+    Empty sets yield blocks with no rows.
+    """
+    index = 0
+    lines = []
+    for line in stream:
+        if line[:1] == "#":
+            if SEPARATOR.match(line):
+                yield index, _block(lines, ndv, nobj, variables)
+                index += 1
+                lines = []
+        elif DATA.match(line):
+            lines.append(line)
+
+def _objectives(data, ndv, nobj):
+    """
+    Parse only the objective columns of many data lines.
+    Converting text to floats is most of the cost of
+    reading, and most columns are decision variables.
+    """
+    ncols = len(data[:data.find("\n")].split())
+    width = ndv + nobj
+    if ncols < width or data.translate(None, NUMERIC) \
+            or not _uniform(data, ncols):
+        # ragged rows or NaNs: do it line by line
+        lines = [line for line in data.splitlines(True)
+                 if DATA.match(line)]
+        return _block(lines, ndv, nobj, False)
+    words = data.split()
+    columns = [words[col::ncols] for col in range(ndv, width)]
+    return numpy.array(columns, dtype=float).T.reshape(-1, nobj)
+
+def _lastseparator(text):
+    """
+    Index just past the last set terminator in text, or 0.
+    """
+    end = len(text)
+    while end > 0:
+        start = text.rfind("\n#", 0, end) + 1
+        stop = text.find("\n", start)
+        if stop >= 0 and SEPARATOR.match(text[start:stop]):
+            return stop + 1
+        end = start - 1
+    return 0
+
+def read_blocks(stream, ndv, nobj, size=2**24):
+    """
+    Yield blocks of objectives, nobj columns each, for all
+    solutions in all complete sets in stream, reading about
+    size characters at a time.  Blocks don't follow set
+    boundaries.
+    """
+    pending = ""
+    while True:
+        text = stream.read(size)
+        if not text:
+            break
+        pending += text
+        if not text.endswith("\n"):
+            pending += stream.readline()
+        last = _lastseparator(pending)
+        complete = pending[:last]
+        pending = pending[last:]
+        data = "".join([line for line
+                        in complete.splitlines(True)
+                        if line[:1] in LEADING])
+        if data:
+            yield _objectives(data, ndv, nobj)
+
+def find_empty_sets(stream, ndv, nobj):
+    """
+    Same result as emptysets.find_empty_sets: indices of
+    the empty sets, and the number of sets.
+    """
+    empties = []
+    counter = 0
+    for index, block in read_sets(stream, ndv, nobj):
+        if len(block) == 0:
+            empties.append(index)
+        counter = index + 1
+    return empties, counter
+
+def write_block(fp, block):
+    """
+    Write a block as a set of a reduced file.
+    """
+    for row in block:
+        fp.write(" ".join([repr(val) for val in row.tolist()]))
+        fp.write("\n")
+    fp.write("#\n")
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filename",
+                        type=argparse.FileType("r"),
+                        help="sets file to reduce")
+    parser.add_argument("ndv", type=int,
+                        help="number of decision variables")
+    parser.add_argument("nobj", type=int,
+                        help="number of objectives")
+    parser.add_argument("-o", "--output",
+                        type=argparse.FileType("w"),
+                        default=sys.stdout,
+                        help="defaults to stdout")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    for _, block in read_sets(args.filename,
+                              args.ndv, args.nobj):
+        write_block(args.output, block)
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
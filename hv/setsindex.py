@@ -0,0 +1,236 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+
+setsindex.py
+
+A sidecar index for a sets file, so that nobody has to
+rescan the whole file to find the # separators.  For
+foo.sets the index is foo.sets.idx, with one line per
+complete set:
+
+    offset length rows empty
+
+offset is where the set's lines start (property lines
+included), length is the number of bytes through its
+terminating #, rows is the number of data rows, and empty
+is 1 if there are none.
+
+Sets files grow while MOEAFramework runs, so the index is
+updated by reading only what was appended since the last
+complete set it knows of.  If the sets file no longer
+agrees with the index, the index is rebuilt.  An index that
+can't be written is kept in memory.
+
+If invoked at the command line, build or update indexes
+and report how many sets each file has.
+"""
+import os
+import sys
+import argparse
+import setsfile
+
+HEADER = "# offset length rows empty\n"
+
+class SetsIndex(object):
+    def __init__(self, filename, indexfile=None):
+        self.filename = filename
+        if indexfile is None:
+            indexfile = "{0}.idx".format(filename)
+        self.indexfile = indexfile
+        self.offsets = []
+        self.lengths = []
+        self.rows = []
+        self.load()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def end(self):
+        """
+        Byte offset just past the last indexed set.
+        """
+        if not self.offsets:
+            return 0
+        return self.offsets[-1] + self.lengths[-1]
+
+    def empty_sets(self):
+        return [index for index, rows in enumerate(self.rows)
+                if rows == 0]
+
+    def load(self):
+        """
+        Read the index file, if there is one that agrees
+        with the sets file.
+        """
+        self.offsets, self.lengths, self.rows = [], [], []
+        if not os.path.exists(self.indexfile):
+            return
+        try:
+            with open(self.indexfile, "r") as fp:
+                for line in fp:
+                    if line.startswith("#"):
+                        continue
+                    offset, length, rows, _ = line.split()
+                    self.offsets.append(int(offset))
+                    self.lengths.append(int(length))
+                    self.rows.append(int(rows))
+        except ValueError: # torn write
+            self.offsets, self.lengths, self.rows = [], [], []
+            return
+        if not self.valid():
+            self.offsets, self.lengths, self.rows = [], [], []
+
+    def valid(self):
+        """
+        Whether the indexed sets are still where the index
+        says: the file is long enough and the last indexed
+        set still ends with a separator.
+        """
+        end = self.end()
+        if end == 0:
+            return True
+        if os.path.getsize(self.filename) < end:
+            return False
+        with open(self.filename, "rb") as fp:
+            fp.seek(self.offsets[-1])
+            text = fp.read(self.lengths[-1])
+        lines = text.splitlines()
+        return len(text) == self.lengths[-1] \
+           and text.endswith("\n") \
+           and bool(setsfile.SEPARATOR.match(lines[-1]))
+
+    def scan(self):
+        """
+        Index the complete sets after end().  Return the
+        new entries.
+        """
+        entries = []
+        with open(self.filename, "rb") as fp:
+            start = self.end()
+            fp.seek(start)
+            position = start
+            rows = 0
+            for line in fp:
+                position += len(line)
+                if line[:1] == "#":
+                    if setsfile.SEPARATOR.match(line):
+                        entries.append((start, position - start,
+                                        rows))
+                        start = position
+                        rows = 0
+                elif setsfile.DATA.match(line):
+                    rows += 1
+        return entries
+
+    def update(self):
+        """
+        Bring the index up to date with the sets file, and
+        write any new entries.
+        """
+        if not self.valid():
+            self.offsets, self.lengths, self.rows = [], [], []
+        rebuild = not self.offsets
+        entries = self.scan()
+        for offset, length, rows in entries:
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.rows.append(rows)
+        if entries or rebuild:
+            self.write(entries, rebuild)
+        return self
+
+    def write(self, entries, rebuild):
+        text = "".join(["{0} {1} {2} {3}\n".format(
+                            offset, length, rows, int(rows == 0))
+                        for offset, length, rows in entries])
+        try:
+            if rebuild:
+                partial = "{0}.{1}.partial".format(
+                            self.indexfile, os.getpid())
+                with open(partial, "w") as fp:
+                    fp.write(HEADER)
+                    fp.write(text)
+                os.rename(partial, self.indexfile)
+            else:
+                with open(self.indexfile, "a") as fp:
+                    fp.write(text)
+        except (IOError, OSError):
+            pass # read-only directory: the index lives in memory
+
+    def read_sets(self, ndv, nobj, first=0, last=None,
+                  variables=False):
+        """
+        Yield (index, block) like setsfile.read_sets, for
+        sets first through last only.
+        """
+        if last is None:
+            last = len(self) - 1
+        if first > last:
+            return
+        start = self.offsets[first]
+        stop = self.offsets[last] + self.lengths[last]
+        with open(self.filename, "rb") as fp:
+            fp.seek(start)
+            lines = fp.read(stop - start).splitlines(True)
+        for index, block in setsfile.read_sets(lines, ndv, nobj,
+                                               variables):
+            yield first + index, block
+
+    def read_set(self, index, ndv, nobj, variables=False):
+        """
+        The block for one set.
+        """
+        for _, block in self.read_sets(ndv, nobj, index, index,
+                                       variables):
+            return block
+
+def index(filename):
+    """
+    An up-to-date index for a sets file.
+    """
+    return SetsIndex(filename).update()
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filenames", nargs="+",
+                        help="sets files to index")
+    parser.add_argument("-k", "--set", type=int,
+                        help="write this set's objectives "\
+                             "instead of a summary")
+    parser.add_argument("-n", "--ndv", type=int, default=0,
+                        help="number of decision variables, "\
+                             "for --set")
+    parser.add_argument("-m", "--nobj", type=int,
+                        help="number of objectives, for --set")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    for filename in args.filenames:
+        idx = index(filename)
+        if args.set is None:
+            print "{0}: {1} sets, {2} empty".format(
+                    filename, len(idx), len(idx.empty_sets()))
+        else:
+            block = idx.read_set(args.set, args.ndv, args.nobj)
+            setsfile.write_block(sys.stdout, block)
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
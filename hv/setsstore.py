@@ -0,0 +1,232 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+
+setsstore.py
+
+A binary, columnar copy of a sets file, so that the text
+is parsed once rather than by every stage.  Borg_GAA_27_3_1
+.sets converts to the directory Borg_GAA_27_3_1.store:
+
+    objectives.npy  float64, one row per solution
+    variables.npy   float64, decision variables (optional)
+    offsets.npy     int64, where each set starts, plus the
+                    total number of rows at the end
+
+The arrays are memory-mapped, and each set is a slice of
+them, so reading a set copies nothing.  Only complete sets
+are converted, so convert a sets file after its run is done.
+
+load_sets reads either a store or a sets file, and
+find_sets lists a directory's inputs, preferring a store to
+the sets file it was converted from unless the sets file is
+newer.
+
+If invoked at the command line, convert sets files to
+stores, or export a store back to text.
+"""
+import os
+import re
+import glob
+import shutil
+import argparse
+import numpy
+import setsfile
+
+class StoreFormatError(Exception):
+    pass
+
+SUFFIX = ".store"
+
+def is_store(path):
+    return os.path.isdir(path) and path.rstrip("/").endswith(SUFFIX)
+
+def storename(filename):
+    return re.sub("\.sets$", "", filename) + SUFFIX
+
+def textname(store):
+    return re.sub("\.store/?$", ".sets", store)
+
+class SetsStore(object):
+    def __init__(self, directory):
+        self.directory = directory
+        self.objectives = self._load("objectives")
+        self.offsets = self._load("offsets")
+        if os.path.exists(self._path("variables")):
+            self.variables = self._load("variables")
+        else:
+            self.variables = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, "{0}.npy".format(name))
+
+    def _load(self, name):
+        return numpy.load(self._path(name), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def ndv(self):
+        if self.variables is None:
+            return 0
+        return self.variables.shape[1]
+
+    def nobj(self):
+        return self.objectives.shape[1]
+
+    def empty_sets(self):
+        return numpy.nonzero(
+                    numpy.diff(self.offsets) == 0)[0].tolist()
+
+    def read_set(self, index, variables=False):
+        start = self.offsets[index]
+        stop = self.offsets[index + 1]
+        if not variables:
+            return self.objectives[start:stop]
+        if self.variables is None:
+            msg = "{0} has no decision variables".format(
+                    self.directory)
+            raise StoreFormatError(msg)
+        return numpy.hstack([self.variables[start:stop],
+                             self.objectives[start:stop]])
+
+    def read_sets(self, first=0, last=None, variables=False):
+        """
+        Yield (index, block) like setsfile.read_sets.
+        """
+        if last is None:
+            last = len(self) - 1
+        for index in range(first, last + 1):
+            yield index, self.read_set(index, variables)
+
+def convert(filename, ndv, nobj, store=None, variables=True):
+    """
+    Write a store for filename.  Return its name.
+    """
+    if store is None:
+        store = storename(filename)
+    objectives = []
+    dvs = []
+    offsets = [0]
+    with open(filename, "r") as fp:
+        for _, block in setsfile.read_sets(fp, ndv, nobj,
+                                           variables=True):
+            objectives.append(block[:, ndv:])
+            dvs.append(block[:, :ndv])
+            offsets.append(offsets[-1] + len(block))
+    partial = "{0}.{1}.partial".format(store.rstrip("/"),
+                                       os.getpid())
+    os.makedirs(partial)
+    numpy.save(os.path.join(partial, "objectives.npy"),
+               numpy.vstack([numpy.empty((0, nobj))]
+                            + objectives))
+    numpy.save(os.path.join(partial, "offsets.npy"),
+               numpy.array(offsets, dtype=numpy.int64))
+    if variables and ndv > 0:
+        numpy.save(os.path.join(partial, "variables.npy"),
+                   numpy.vstack([numpy.empty((0, ndv))] + dvs))
+    if os.path.exists(store):
+        shutil.rmtree(store)
+    os.rename(partial, store)
+    return store
+
+def export(store, fp):
+    """
+    Write a store back out as a sets file.
+    """
+    fp.write("# Variables = {0}\n".format(store.ndv()))
+    fp.write("# Objectives = {0}\n".format(store.nobj()))
+    for _, block in store.read_sets(
+                        variables=store.variables is not None):
+        setsfile.write_block(fp, block)
+
+def load_sets(path, ndv, nobj, variables=False):
+    """
+    Yield (index, block) for every complete set in a store
+    or a sets file.
+    """
+    if not is_store(path):
+        with open(path, "r") as fp:
+            for index, block in setsfile.read_sets(
+                                    fp, ndv, nobj, variables):
+                yield index, block
+        return
+    store = SetsStore(path)
+    if store.nobj() != nobj:
+        msg = "{0} has {1} objectives, not {2}".format(
+                path, store.nobj(), nobj)
+        raise StoreFormatError(msg)
+    for index, block in store.read_sets(variables=variables):
+        yield index, block
+
+def find_sets(dirname):
+    """
+    Sets files and stores in dirname, one per run.
+    """
+    sets = glob.glob(os.path.join(dirname, "*sets"))
+    stores = [store for store
+              in glob.glob(os.path.join(dirname, "*" + SUFFIX))
+              if is_store(store)]
+    found = []
+    converted = set()
+    for store in stores:
+        text = textname(store)
+        if os.path.exists(text) and os.path.getmtime(text) \
+                                  > os.path.getmtime(store):
+            continue # the run went on after conversion
+        converted.add(text)
+        found.append(store)
+    found.extend([aset for aset in sets if aset not in converted])
+    return found
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filenames", nargs="+",
+                        help="sets files to convert, or with "\
+                             "--export, one store")
+    parser.add_argument("-n", "--ndv", type=int, default=0,
+                        help="number of decision variables")
+    parser.add_argument("-m", "--nobj", type=int,
+                        help="number of objectives")
+    parser.add_argument("--objectives-only",
+                        action="store_true",
+                        help="don't store decision variables")
+    parser.add_argument("-x", "--export",
+                        type=argparse.FileType("w"),
+                        help="write the store back out as a "\
+                             "sets file here")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    if args.export:
+        export(SetsStore(args.filenames[0]), args.export)
+        args.export.close()
+        return
+    if args.nobj is None:
+        print "--nobj is required to convert"
+        return
+    for filename in args.filenames:
+        store = convert(filename, args.ndv, args.nobj,
+                        variables=not args.objectives_only)
+        print "{0}: {1} sets".format(store,
+                                     len(SetsStore(store)))
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
@@ -18,44 +18,164 @@ along with this script. If not, see <http://www.gnu.org/licenses/>.
 
 submit.py
 Submit a batch of compute_hypervolumes runs to a PBS batch server.
+
+With --array, each algo/problem is one PBS array job whose tasks
+evaluate shards of its seeds.  Shards that compute_hypervolumes
+has recorded as complete in its manifest are not resubmitted, so
+running this again finishes off whatever failed.  With --local,
+the same shards run here in a pool of processes instead.
 """
 
 from subprocess import Popen, PIPE
 import os
 import re
 import argparse
+import multiprocessing
 import time
+import compute_hypervolumes
 
-def commandline(algo, ndv, nobj, eps, ref, seed):
+def commandline(algo, ndv, nobj, eps, ref, seed, engine="java",
+                jobs=None, shard=None, shards=None):
     cml = ["python", "compute_hypervolumes.py", 
             algo, ndv, nobj, eps, "-r", ref]
-    cml.extend(["-s", str(seed)])
+    if shards is not None:
+        cml.extend(["--shard", str(shard),
+                    "--shards", str(shards)])
+        if jobs is not None:
+            cml.extend(["-j", str(jobs)])
+    elif jobs is None:
+        cml.extend(["-s", str(seed)])
+    else:
+        cml.extend(["-j", str(jobs)])
+    cml.extend(["-e", engine])
     return cml
 
-def script(commandline, name):
+def script(commandline, name, ppn=1, tasks=None):
+    """
+    tasks: array job task ids
+    """
     script = [
                 "#PBS -N {0}".format(name),
-                "#PBS -l nodes=1:ppn=1",
+                "#PBS -l nodes=1:ppn={0}".format(ppn),
                 "#PBS -l walltime=6:00:00",
                 "#PBS -o {0}".format(os.path.join("output",name)),
                 "#PBS -e {0}".format(os.path.join("error",name)),
                 "cd $PBS_O_WORKDIR",
                 " ".join(commandline)
              ]
+    if tasks is not None:
+        script.insert(1, "#PBS -t {0}".format(
+                            ",".join([str(tt) for tt in tasks])))
     return script
 
-def submit(algo, problem, refdir, seed=None):
+def directories(algo, problem, root=None):
+    """
+    Arguments that put the sets, working directory and
+    output of algo/problem under root, in the same layout
+    as the default scratch directories.
+    """
+    if root is None:
+        return []
+    name = "_".join([algo, problem])
+    return ["-d", os.path.join(root, "sets", name),
+            "-w", os.path.join(root, "hv", "temp", name),
+            "-o", os.path.join(root, "hv", name + ".hv")]
+
+def missing_shards(algo, problem, refdir, shards,
+                   engine="java", root=None):
+    """
+    Shards of algo/problem not yet recorded as complete
+    with this reference set and engine
+    """
+    ndv, nobj, eps = problem.split("_")
+    if root is None:
+        workdir = compute_hypervolumes.workingdirectory(
+                                        algo, ndv, nobj, eps)
+    else:
+        workdir = directories(algo, problem, root)[3]
+    manifest = compute_hypervolumes.manifestfilename(
+                                workdir, algo, ndv, nobj, eps)
+    key = compute_hypervolumes.run_key(
+                [reference(problem, refdir)], engine)
+    done = compute_hypervolumes.read_manifest(manifest, shards,
+                                              key)
+    return [shard for shard in range(shards) if shard not in done]
+
+def reference(problem, refdir):
+    _, nobj, eps = problem.split("_")
+    return os.path.join(refdir, 
+                        "m.{0}_{1}_extended.ref".format(nobj, eps))
+
+def submit_array(algo, problem, refdir, shards, engine="java",
+                 jobs=None, root=None):
+    """
+    One array job for the missing shards of algo/problem.
+    Returns None if there are none.
+    """
+    tasks = missing_shards(algo, problem, refdir, shards,
+                           engine, root)
+    if not tasks:
+        return None
+    ndv, nobj, eps = problem.split("_")
+    cml = commandline(algo, ndv, nobj, eps,
+                      reference(problem, refdir), None, engine,
+                      jobs, "$PBS_ARRAYID", shards)
+    cml.extend(directories(algo, problem, root))
+    name = "_".join(["h", problem, algo])
+    child = Popen("qsub", stdin=PIPE, stdout=PIPE)
+    child.stdin.write("\n".join(script(cml, name, jobs or 1,
+                                       tasks)))
+    child.stdin.close()
+    jobid = child.stdout.read()
+    return jobid.strip()
+
+def run(cml):
+    print " ".join(cml)
+    return Popen(cml).wait()
+
+def run_local(algos, problems, refdir, shards, processes,
+              engine="java", root=None):
+    """
+    Run the missing shards of every algo/problem here, in a
+    pool of processes.  Return the number that failed.
+    """
+    cmls = []
+    for algo in algos:
+        for problem in problems:
+            ndv, nobj, eps = problem.split("_")
+            for shard in missing_shards(algo, problem, refdir,
+                                        shards, engine, root):
+                cml = commandline(algo, ndv, nobj, eps,
+                                  reference(problem, refdir),
+                                  None, engine, None, shard,
+                                  shards)
+                cml.extend(directories(algo, problem, root))
+                cmls.append(cml)
+    pool = multiprocessing.Pool(processes)
+    try:
+        statuses = pool.map(run, cmls, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return len([status for status in statuses if status != 0])
+
+def submit(algo, problem, refdir, seed=None, engine="java",
+           jobs=None):
+    """
+    With jobs, one job evaluates every seed of algo/problem
+    on that many cores.  Otherwise one job per seed.
+    """
     ndv, nobj, eps = problem.split("_")
-    ref = os.path.join(refdir, 
-                       "m.{0}_{1}_extended.ref".format(nobj, eps))
-    cml = commandline(algo, ndv, nobj, eps, ref, seed)
+    cml = commandline(algo, ndv, nobj, eps,
+                      reference(problem, refdir), seed, engine,
+                      jobs)
     name = ["h"]
-    if seed is not None:
+    if seed is not None and jobs is None:
         name.append(str(seed))
     name.extend([ problem, algo])
     name = "_".join(name)
     child = Popen("qsub", stdin=PIPE, stdout=PIPE)
-    child.stdin.write("\n".join(script(cml, name)))
+    child.stdin.write("\n".join(script(cml, name, jobs or 1)))
     child.stdin.close()
     jobid = child.stdout.read()
     return jobid.strip()
@@ -72,8 +192,7 @@ def get_args():
                                  "18_10_1.0,18_3_1.0,18_3_0.1")
     parser.add_argument("-s", "--start-seed", type = int,
                         help="Specify only if you want single-seed "\
-                             "runs. These don't accumulate results.",
-                        required = True
+                             "runs. These don't accumulate results."
                        )
     parser.add_argument("-e", "--end-seed", type=int,
                         help="Specify only if you want single-seed "\
@@ -83,17 +202,63 @@ def get_args():
                         help="directory with reference files",
                         default="/gpfs/scratch/mjw5407/task1/"\
                                 "ref/extended")
+    parser.add_argument("-E", "--engine",
+                        choices = ["java", "native"],
+                        default = "java",
+                        help="metrics engine for "\
+                             "compute_hypervolumes.py")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="submit one job per algo/problem "\
+                             "that evaluates all seeds on this "\
+                             "many cores, instead of one job "\
+                             "per seed")
+    parser.add_argument("-A", "--array", type=int,
+                        metavar="SHARDS",
+                        help="submit one array job per algo/"\
+                             "problem, with this many tasks, "\
+                             "each evaluating a shard of the "\
+                             "seeds.  Shards already done are "\
+                             "skipped.  --jobs sets the cores "\
+                             "per task.")
+    parser.add_argument("-L", "--local", type=int,
+                        metavar="PROCESSES",
+                        help="with --array, run the shards "\
+                             "here in this many processes "\
+                             "instead of submitting them")
+    parser.add_argument("-R", "--root",
+                        help="with --array, use ROOT/sets, "\
+                             "ROOT/hv and ROOT/hv/temp in "\
+                             "place of the scratch "\
+                             "directories under /gpfs")
 
     return parser.parse_args()
 
 def cli():
     args = get_args()
+    if args.jobs is None and args.start_seed is None \
+            and args.array is None:
+        print "Specify --start-seed, or --jobs or --array to "\
+              "run all seeds"
+        return
+    if args.local is not None and args.array is None:
+        print "--local needs --array"
+        return
         
     valid_algos = ["BorgRecency", "Borg", "GDE3", 
                    "NSGAII", "eNSGAII", "eMOEA"]
     valid_problems = ["27_10_1.0", "27_3_1.0", "27_3_0.1", 
                       "18_10_1.0", "18_3_1.0", "18_3_0.1"]
     refdir = args.reference_dir
+    if args.local is not None:
+        algos = [algo for algo in args.algos.split(",")
+                 if algo in valid_algos]
+        problems = [problem for problem
+                    in args.problems.split(",")
+                    if problem in valid_problems]
+        failed = run_local(algos, problems, refdir, args.array,
+                           args.local, args.engine, args.root)
+        print "{0} shards failed".format(failed)
+        return
     for algo in args.algos.split(","):
         if not algo in valid_algos:
             print "{0}: unknown MOEA".format(algo)
@@ -101,12 +266,28 @@ def cli():
         for problem in args.problems.split(","):
             if not problem in valid_problems:
                 print "{0}: unknown problem".format(problem)
-            if args.start_seed is not None and args.end_seed is not None:
+            if args.array is not None:
+                jobid = submit_array(algo, problem, refdir,
+                                     args.array, args.engine,
+                                     args.jobs, args.root)
+                if jobid is None:
+                    print "{0} {1} is complete".format(
+                            algo, problem)
+                else:
+                    print jobid
+                    time.sleep(0.5)
+            elif args.jobs is not None:
+                print submit(algo, problem, refdir, None,
+                             args.engine, args.jobs)
+                time.sleep(0.5)
+            elif args.start_seed is not None and args.end_seed is not None:
                 for seed in range(args.start_seed, args.end_seed + 1):
-                    print submit(algo, problem, refdir, seed)
+                    print submit(algo, problem, refdir, seed,
+                                 args.engine)
                     time.sleep(0.5)
             else:
-                print submit(algo, problem, refdir, args.start_seed)
+                print submit(algo, problem, refdir, 
+                             args.start_seed, args.engine)
                 time.sleep(0.5)
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+archive.py
+An epsilon-box dominance archive that behaves the way
+MOEAFramework's EpsilonBoxDominanceArchive does:
+
+- Objectives are minimized.  A point's box is
+  floor(objective / epsilon) in every objective.
+- A point whose box is dominated by a box in the archive
+  is rejected.  A point whose box dominates archived boxes
+  replaces those points.
+- Of two points in the same box, the one nearer the box's
+  lower corner is kept.  On a tie the archived point stays.
+- Points stay in the order they were added.
+
+Each point may carry a tag, such as where it came from,
+which is kept with it but plays no part in the sorting.
+
+The archive also keeps the best and worst value of each
+objective over every point offered to it, kept or not,
+since a merge is the one place every point passes through.
+Once widened by NaN, because some points' bounds are
+unknown, they stay NaN.
+
+Points are added in batches.  A batch is first checked
+against the whole archive at once, since anything the
+archive rejects now it would still reject later.  The
+survivors are then added one at a time, because each may
+displace the ones before it.
+"""
+import math
+import numpy
+
+# Upper bound on elements in any temporary array
+BLOCK = 2 ** 22
+
+def corner_distance(objectives, box, epsilons):
+    """
+    Distance from a point to the lower corner of its box,
+    summed in the same order as MOEAFramework does.
+    """
+    total = 0.0
+    for value, index, eps in zip(objectives, box, epsilons):
+        total += (value - index * eps) ** 2
+    return math.sqrt(total)
+
+class EpsilonBoxArchive(object):
+    def __init__(self, epsilons):
+        self.epsilons = numpy.asarray(epsilons, dtype=float)
+        nobj = len(self.epsilons)
+        self.objectives = numpy.empty((0, nobj))
+        self.boxes = numpy.empty((0, nobj))
+        self.distances = numpy.empty(0)
+        self.variables = []
+        self.tags = []
+        self.minimum = numpy.empty(nobj)
+        self.minimum.fill(numpy.inf)
+        self.maximum = -self.minimum
+
+    def __len__(self):
+        return len(self.objectives)
+
+    def box(self, objectives):
+        return numpy.floor(objectives / self.epsilons)
+
+    def widen(self, minimum, maximum):
+        """
+        Take in the bounds of points offered elsewhere
+        """
+        self.minimum = numpy.minimum(self.minimum, minimum)
+        self.maximum = numpy.maximum(self.maximum, maximum)
+
+    def rejected(self, boxes, distances, ties=True):
+        """
+        Mask of points the archive would reject as it
+        stands: box-dominated, or in an occupied box but no
+        nearer its corner.  With ties False, a point as near
+        as the archived one is not rejected, as if it had
+        arrived first.
+        """
+        mask = numpy.zeros(len(boxes), dtype=bool)
+        if len(self) == 0:
+            return mask
+        nobj = boxes.shape[1]
+        step = max(1, BLOCK // (len(self) * nobj))
+        for start in range(0, len(boxes), step):
+            block = boxes[start:start+step, numpy.newaxis, :]
+            noworse = (self.boxes[numpy.newaxis] <= block).all(2)
+            better = (self.boxes[numpy.newaxis] < block).any(2)
+            same = noworse & ~better
+            if ties:
+                nearer = self.distances[numpy.newaxis, :] \
+                      <= distances[start:start+step, numpy.newaxis]
+            else:
+                nearer = self.distances[numpy.newaxis, :] \
+                      < distances[start:start+step, numpy.newaxis]
+            mask[start:start+step] = (noworse & better).any(1) \
+                                   | (same & nearer).any(1)
+        return mask
+
+    def add(self, objectives, variables=None, tags=None):
+        """
+        Add a batch of points: objectives has one row per
+        point, and variables and tags, if given, one
+        sequence of decision variables and one tag per
+        point.  Returns the number of points accepted,
+        though some may since have been displaced by later
+        points in the same batch.
+        """
+        objectives = numpy.asarray(objectives, dtype=float)
+        if objectives.ndim == 1:
+            objectives = objectives.reshape(1, -1)
+        if variables is None:
+            variables = [()] * len(objectives)
+        if tags is None:
+            tags = [None] * len(objectives)
+        if len(objectives) == 0:
+            return 0
+        self.widen(objectives.min(0), objectives.max(0))
+        boxes = self.box(objectives)
+        distances = numpy.array([
+                        corner_distance(obj, box, self.epsilons)
+                        for obj, box in zip(objectives, boxes)])
+        candidates = numpy.nonzero(
+                        ~self.rejected(boxes, distances))[0]
+        accepted = 0
+        for index in candidates:
+            if self._add(objectives[index], boxes[index],
+                         distances[index], variables[index],
+                         tags[index]):
+                accepted += 1
+        return accepted
+
+    def _add(self, objectives, box, distance, variables, tag):
+        if len(self):
+            better = (box < self.boxes).any(1)
+            worse = (box > self.boxes).any(1)
+            if (worse & ~better).any():
+                return False
+            same = ~better & ~worse
+            if (same & (self.distances <= distance)).any():
+                return False
+            keep = ~(better & ~worse) & ~same
+            if not keep.all():
+                self.keep(keep)
+        self.objectives = numpy.vstack([self.objectives,
+                                        objectives])
+        self.boxes = numpy.vstack([self.boxes, box])
+        self.distances = numpy.append(self.distances, distance)
+        self.variables.append(variables)
+        self.tags.append(tag)
+        return True
+
+    def keep(self, mask):
+        """
+        Keep only the points where mask is True
+        """
+        self.objectives = self.objectives[mask]
+        self.boxes = self.boxes[mask]
+        self.distances = self.distances[mask]
+        self.variables = [var for var, kept
+                          in zip(self.variables, mask) if kept]
+        self.tags = [old for old, kept
+                     in zip(self.tags, mask) if kept]
+
+    def restore(self, objectives, variables, tags):
+        """
+        Append points known to be mutually nondominated in
+        the epsilon-box sense, such as a saved archive,
+        without checking them.
+        """
+        objectives = numpy.asarray(objectives,
+                                   dtype=float).reshape(
+                                        -1, len(self.epsilons))
+        if len(objectives):
+            self.widen(objectives.min(0), objectives.max(0))
+        boxes = self.box(objectives)
+        self.objectives = numpy.vstack([self.objectives,
+                                        objectives])
+        self.boxes = numpy.vstack([self.boxes, boxes])
+        self.distances = numpy.append(self.distances, [
+                        corner_distance(obj, box, self.epsilons)
+                        for obj, box in zip(objectives, boxes)])
+        self.variables.extend(variables)
+        self.tags.extend(tags)
+
+    def rows(self):
+        """
+        (variables, objectives) for each archived point, in
+        order.
+        """
+        return zip(self.variables, self.objectives)
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=68:number:fdm=indent
@@ -0,0 +1,171 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+batchcombine.py
+Do what combine_refsets.py does for several configurations
+at once, in one pool of processes.  A configuration is
+NOBJ_EPS, optionally followed by :ALGO and :NDV, the same
+filters as combine_refsets.py --algorithm and --ndv, so
+3_0.1:Borg is m.Borg_3_0.1.ref and 10_1.0::27 is
+m.27_10_1.0.ref.
+
+Each input reference set is read and epsilon-sorted once,
+however many configurations use it, and every
+configuration's archives are then merged pairwise in the
+same pool, as treemerge.py does.  The output is what
+combine_refsets.py would write for each configuration:
+m.*.ref, with its .prov and .bounds, and with --contribution
+c.*, written in the pool too.
+"""
+import argparse
+import multiprocessing
+import merge
+import combine_refsets
+from archive import EpsilonBoxArchive
+
+class ConfigurationError(Exception):
+    pass
+
+def parse(text):
+    """
+    (nobj, eps, algorithm, ndv) for a configuration
+    """
+    fields = text.split(":")
+    if len(fields) > 3 or len(fields[0].split("_")) != 2:
+        msg = "{0} is not NOBJ_EPS[:ALGO[:NDV]]".format(text)
+        raise ConfigurationError(msg)
+    fields.extend([""] * (3 - len(fields)))
+    nobj, eps = fields[0].split("_")
+    try:
+        combine_refsets.epsilons(nobj, eps)
+    except KeyError:
+        msg = "no epsilons known for {0}".format(fields[0])
+        raise ConfigurationError(msg)
+    return nobj, eps, fields[1] or None, fields[2] or None
+
+def write_outputs(archive, outputfn):
+    with open(outputfn, "w") as fp:
+        merge.write_archive(archive, fp)
+    with open(merge.provenancename(outputfn), "w") as fp:
+        merge.write_provenance(archive, fp)
+    merge.save_bounds(archive, outputfn)
+
+def copy(leaf):
+    """
+    A copy of a leaf archive tagged with provenance only
+    """
+    archive = merge.ordered(leaf)
+    archive.tags = [tag[-1] for tag in archive.tags]
+    return archive
+
+def batch(configs, inputdir, outputdir, mapper=map):
+    """
+    Merge every configuration.  Return (output filename,
+    archive) for each.
+    """
+    groups = []
+    tasks = []
+    found = {}
+    for nobj, eps, algorithm, ndv in configs:
+        epsilons = merge.epsilon_list(
+                        combine_refsets.epsilons(nobj, eps))
+        sets = combine_refsets.input_filenames(
+                        algorithm, ndv, nobj, eps, inputdir)
+        group = []
+        for filename in sets:
+            # rows are read differently for different ndv
+            key = (filename, int(ndv or 0))
+            if key not in found:
+                found[key] = len(tasks)
+                tasks.append(((), filename, int(ndv or 0),
+                              epsilons))
+            group.append(found[key])
+        groups.append((epsilons, group))
+    leaves = mapper(merge.leaf, tasks)
+    outputs = []
+    archives = []
+    for (nobj, eps, algorithm, ndv), (epsilons, group) in zip(
+                                            configs, groups):
+        outputs.append(combine_refsets.output_filename(
+                            algorithm, ndv, nobj, eps, outputdir))
+        # the same leaf may be merged into several groups
+        archives.append([copy(leaves[number]) for number in group]
+                        or [EpsilonBoxArchive(epsilons)])
+    return zip(outputs, merge.combine_groups(archives, mapper))
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("configs", nargs="+",
+                        help="configurations, NOBJ_EPS, "\
+                             "optionally with :ALGO and :NDV, "\
+                             "for instance 3_0.1 3_0.1:Borg "\
+                             "10_1.0::27")
+    parser.add_argument("-i", "--input_directory",
+                        default="/gpfs/scratch/mjw5407/task1/ref")
+    parser.add_argument("-o", "--output_directory",
+                        default="/gpfs/scratch/mjw5407/task1/ref")
+    parser.add_argument("-c", "--contribution", action='store_true',
+                        help="write each point with its "\
+                             "provenance to c.*")
+    parser.add_argument("-b", "--by", choices=sorted(
+                                    combine_refsets.GROUPS.keys()),
+                        help="count contributions per "\
+                             "algorithm, seed or set")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="processes to merge with")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    try:
+        configs = [parse(text) for text in args.configs]
+    except ConfigurationError as err:
+        print err
+        return
+    if args.jobs == 1:
+        pool = None
+        mapper = map
+    else:
+        pool = multiprocessing.Pool(args.jobs)
+        mapper = lambda function, items: pool.map(
+                                function, items, chunksize=1)
+    try:
+        results = batch(configs, args.input_directory,
+                        args.output_directory, mapper)
+        for outputfn, archive in results:
+            write_outputs(archive, outputfn)
+            print "{0}: {1} points".format(outputfn, len(archive))
+            if args.by:
+                for key, count in combine_refsets.tabulate(
+                        archive.tags,
+                        combine_refsets.GROUPS[args.by]):
+                    print "{0} {1}".format(
+                            " ".join([str(field) for field in key]),
+                            count)
+        if args.contribution:
+            mapper(combine_refsets.provenance_contribution,
+                   [outputfn for outputfn, _ in results])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=68:number:fdm=indent
@@ -16,14 +16,37 @@ along with this script. If not, see <http://www.gnu.org/licenses/>.
 
 ===========================================================
 combine_refsets:
-Use MOEAFramework to sort reference sets together.  Optionally,
-determine contributions.
+Epsilon-sort reference sets together, with merge.py or, with
+--java, MOEAFramework.  Optionally, determine contributions.
+
+merge.py records where each point came from as it merges,
+so without --java the contributions are read from the
+merged set's provenance (m.FOO.prov), and c.FOO gives each
+reference point followed by its algorithm, ndv, seed and
+set.  --by counts the points contributed per algorithm, per
+seed or per set.  With --java, contributions are found by
+matching the reference set against every input, and c.FOO
+lists the input files each point appears in.
+
+Without --java, the best and worst of each objective over
+every point behind the merged set go to m.FOO.bounds, for
+broaden_refset.py, so scanproblem.py needn't be run.  They
+can only be known if every input has a .bounds of its own;
+if one doesn't, m.FOO.bounds is not written.
+
+batchcombine.py runs several configurations at once.
 """
 from subprocess import Popen, PIPE
 import re
 import glob
 import os
+import math
 import argparse
+import itertools
+import merge
+
+# provenance fields that identify a contributor
+GROUPS = {"algorithm": 2, "seed": 3, "set": 4}
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -38,6 +61,16 @@ def get_args():
     parser.add_argument("-c", "--contribution", action='store_true',
                         help="tabulate contributions to the "\
                              "final reference set")
+    parser.add_argument("--java", action="store_true",
+                        help="merge with PSOResultFileMerger "\
+                             "instead of merge.py")
+    parser.add_argument("-b", "--by",
+                        choices=sorted(GROUPS.keys()),
+                        help="count contributions per "\
+                             "algorithm, seed or set")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="merge as a reduction tree in "\
+                             "this many processes")
                         
     return parser.parse_args()
 
@@ -120,6 +153,79 @@ def compare(row1, row2, tol=1e-5):
 
     return same
 
+class Matcher(object):
+    """
+    Finds the rows that compare() would call equal to a
+    given row, without comparing against every row.  Rows
+    are hashed on the logarithms of their first few values,
+    in buckets several tolerances wide, so the rows that
+    can match lie in one or two buckets per hashed value.
+    Every candidate is still checked with compare().
+    """
+    def __init__(self, rows, tol=1e-5, hashed=3):
+        self.rows = rows
+        self.tol = tol
+        self.hashed = hashed
+        self.step = 4.0 * math.log1p(tol)
+        self.buckets = {}
+        self.unhashable = []
+        for index, row in enumerate(rows):
+            key = self.key(row)
+            if key is None:
+                self.unhashable.append(index)
+            else:
+                self.buckets.setdefault(key, []).append(index)
+
+    def _bucket(self, magnitude):
+        return int(math.floor(math.log(magnitude) / self.step))
+
+    def _buckets(self, value):
+        """
+        Buckets holding every value that compare() could
+        match to this one.
+        """
+        if value == 0.0:
+            return [(0, 0)]
+        sign = 1 if value > 0 else -1
+        slack = 2.0 * self.tol
+        low = self._bucket(abs(value) * (1.0 - slack))
+        high = self._bucket(abs(value) * (1.0 + slack))
+        return [(sign, bucket) for bucket
+                in range(low, high + 1)]
+
+    def key(self, row):
+        values = row[:self.hashed]
+        if not all([abs(val) < float("inf") for val in values]):
+            return None # infinity or NaN
+        key = [len(row)]
+        for value in values:
+            if value == 0.0:
+                key.append((0, 0))
+            else:
+                key.append((1 if value > 0 else -1,
+                            self._bucket(abs(value))))
+        return tuple(key)
+
+    def candidates(self, row):
+        values = row[:self.hashed]
+        if not all([abs(val) < float("inf") for val in values]):
+            return range(len(self.rows))
+        keys = [(len(row),)]
+        for value in values:
+            keys = [key + (bucket,) for key in keys
+                    for bucket in self._buckets(value)]
+        found = list(self.unhashable)
+        for key in keys:
+            found.extend(self.buckets.get(key, []))
+        return sorted(found)
+
+    def matches(self, row):
+        """
+        Indices of the rows equal to row, within tolerance
+        """
+        return [index for index in self.candidates(row)
+                if compare(self.rows[index], row, self.tol)]
+
 def linetorow(line):
     return [float(val) for val in line.strip().split(" ")]
 
@@ -128,8 +234,9 @@ def rowtoline(row):
 
 def contribution(sets, refset, refdvs):
     """
-    I think this is inescapably n^2
-    But it's fast enough and it works.
+    Find which input sets each reference set row came from.
+    Rows are looked up with a Matcher rather than compared
+    against every reference set row.
     """
     contribfile = re.sub("m\.", "c.", refset)
     ref = []
@@ -144,6 +251,7 @@ def contribution(sets, refset, refdvs):
     matches = []
     for _ in range(len(ref)):
         matches.append(list())
+    matchers = {}
     for aset in sets:
         attributes = os.path.basename(aset).split("_")
         ndv = int(attributes[1])
@@ -154,13 +262,17 @@ def contribution(sets, refset, refdvs):
             offset = ndv
             refoffset = refdvs
 
+        if refoffset not in matchers:
+            matchers[refoffset] = Matcher(
+                        [row[refoffset:] for row in ref])
+        matcher = matchers[refoffset]
+
         with open(aset, "r") as fp:
             line = fp.readline()
             while line:
                 row = linetorow(line)
-                for ii in range(len(ref)):
-                    if compare(ref[ii][refoffset:], row[offset:]):
-                        matches[ii].append(aset)
+                for ii in matcher.matches(row[offset:]):
+                    matches[ii].append(aset)
                 line = fp.readline()
 
     with open(contribfile, "w") as fp:
@@ -172,6 +284,32 @@ def contribution(sets, refset, refdvs):
             
     
 
+def provenance_contribution(refset):
+    """
+    Write each reference set row with its provenance, a
+    line at a time.
+    """
+    contribfile = re.sub("m\.", "c.", refset)
+    provenance = merge.provenance_lines(
+                    merge.provenancename(refset))
+    with open(refset, "r") as reffp:
+        rows = (line.strip() for line in reffp if line.strip())
+        with open(contribfile, "w") as fp:
+            for row, source in itertools.izip(rows, provenance):
+                fp.write("{0} {1}\n".format(row,
+                                            " ".join(source)))
+
+def tabulate(provenance, fields):
+    """
+    Count points per contributor, identified by the first
+    few provenance fields.
+    """
+    counts = {}
+    for source in provenance:
+        key = tuple(source[:fields])
+        counts[key] = counts.get(key, 0) + 1
+    return sorted(counts.items())
+
 def cli():
     args = get_args()
     sets = input_filenames(args.algorithm, args.ndv, 
@@ -181,11 +319,32 @@ def cli():
     outputfn = output_filename(args.algorithm, args.ndv,
                            args.nobj, args.epsilon_scaling,
                            args.output_directory)
-    cml = commandline(args.ndv, eps, sets, outputfn)
-    child = Popen(cml, stdout=PIPE)
-    child.stdout.read()
-
-    if args.contribution:
+    if args.java:
+        cml = commandline(args.ndv, eps, sets, outputfn)
+        child = Popen(cml, stdout=PIPE)
+        child.stdout.read()
+    elif args.jobs is not None:
+        archive = merge.tree_merge(sets, int(args.ndv or 0),
+                                   merge.epsilon_list(eps),
+                                   args.jobs)
+    else:
+        archive = merge.merge(sets, int(args.ndv or 0),
+                              merge.epsilon_list(eps))
+    if not args.java:
+        with open(outputfn, "w") as fp:
+            merge.write_archive(archive, fp)
+        with open(merge.provenancename(outputfn), "w") as fp:
+            merge.write_provenance(archive, fp)
+        merge.save_bounds(archive, outputfn)
+        if args.contribution:
+            provenance_contribution(outputfn)
+        if args.by:
+            for key, count in tabulate(archive.tags,
+                                       GROUPS[args.by]):
+                print "{0} {1}".format(
+                        " ".join([str(field) for field in key]),
+                        count)
+    elif args.contribution:
         if args.ndv:
             contribution(sets, outputfn, int(args.ndv))
         else:
@@ -0,0 +1,560 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+merge.py
+Epsilon-sort sets files (or reference sets) together, in
+process, the way PSOResultFileMerger does, with the same
+command line and the same output: decision variables, then
+objectives, formatted the way Java formats doubles.
+
+Input is read the way PSOResultFileReader reads it.  Lines
+starting with # end a set, and a file's last set needn't be
+terminated, which is how a reference set file is read as a
+single set.  A row with exactly vars + dimension values has
+decision variables; otherwise its objectives are its last
+dimension values and it has no decision variables.  Binary
+stores made by hv/setsstore.py are read directly.
+
+Each point carries its provenance through the merge: the
+algorithm, number of decision variables and seed, from the
+input's name (ALGO_GAA_NDV_NOBJ_SEED.sets, or
+ALGO_NDV_NOBJ_EPS.ref, with no seed), and the index of its
+set, numbered the way hv numbers them.  With --provenance,
+the merged set's provenance is written beside it,
+FOO.prov for FOO.ref, one line of "algo ndv seed set" per
+point.  A reference set with a .prov beside it passes its
+points' provenance on to the next merge, so a combined
+reference set knows which seed of which algorithm each of
+its points came from.  Unknown fields are written as *.
+
+The best and worst value of each objective, over every
+point read, is kept as well.  With --bounds it is written
+to FOO.bounds, in the format that scanproblem.py writes and
+hv/broaden_refset.py reads: a header line, then
+"FOO best,best,... worst,worst,...".  A reference set with
+a .bounds beside it passes its bounds on, so a combined
+reference set's bounds cover every point of every seed
+without scanning the sets files again.  One without a
+.bounds leaves the bounds unknown, since its own points are
+only the survivors of the points it was merged from, and
+then no .bounds is written.
+
+With --jobs, merge as a reduction tree in a pool of
+processes.  Every input file is epsilon-sorted into an
+archive of its own, then neighbouring archives are merged
+pairwise, a level at a time, until one is left.  What
+survives an epsilon-box archive doesn't depend on the order
+points arrive in: it is the best point in each nondominated
+box, and on a tie the first.  The survivors also stay in the
+order they arrived.  So each point is tagged with where it
+came from, the left archive of each pair always holds the
+earlier inputs, and the result is put back in tag order at
+the end, which gives the same output as merging serially.
+
+With --memory, no more than about that many megabytes of
+points are held at once.  Inputs are read a piece at a
+time, and the archive spills to disk whenever it outgrows
+the budget (see spill.py), so sets of any size can be
+merged on a login node, with the same output.  With --list,
+inputs are read from a file, or - for standard input, as
+well as from the command line, so there is no limit on how
+many there can be.
+"""
+import os
+import re
+import sys
+import math
+import argparse
+import itertools
+import multiprocessing
+import numpy
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "hv"))
+import setsfile
+import setsstore
+import spill
+from archive import EpsilonBoxArchive
+
+def javadouble(value):
+    """
+    The text Java's Double.toString gives for value
+    """
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "Infinity" if value > 0 else "-Infinity"
+    sign = "-" if math.copysign(1.0, value) < 0 else ""
+    if value == 0.0:
+        return sign + "0.0"
+    # shortest digits that round-trip, and the exponent of
+    # the first of them
+    mantissa, _, exponent = repr(abs(value)).partition("e")
+    whole, _, fraction = mantissa.partition(".")
+    digits = whole + fraction
+    exponent = len(whole) - 1 + int(exponent or 0)
+    stripped = digits.lstrip("0")
+    exponent -= len(digits) - len(stripped)
+    digits = stripped.rstrip("0") or "0"
+    if 1e-3 <= abs(value) < 1e7:
+        if exponent >= 0:
+            whole = digits[:exponent + 1].ljust(exponent + 1, "0")
+            fraction = digits[exponent + 1:] or "0"
+        else:
+            whole = "0"
+            fraction = "0" * (-exponent - 1) + digits
+        return "{0}{1}.{2}".format(sign, whole, fraction)
+    return "{0}{1}.{2}E{3}".format(sign, digits[0],
+                                   digits[1:] or "0", exponent)
+
+class ProvenanceError(Exception):
+    pass
+
+UNKNOWN = "*"
+SETSNAME = re.compile("^(?P<algo>[^_]+)_.*_(?P<ndv>[0-9]+)_"\
+                      "[0-9]+_(?P<seed>[0-9]+)\.(sets|store)$")
+REFNAME = re.compile("^(?P<algo>[^_.]+)_(?P<ndv>[0-9]+)_"\
+                     "[0-9]+_[^_]+\.ref$")
+
+def origin(filename):
+    """
+    (algorithm, ndv, seed) for an input, from its name
+    """
+    name = os.path.basename(filename.rstrip("/"))
+    match = SETSNAME.match(name)
+    if match:
+        return match.group("algo", "ndv", "seed")
+    match = REFNAME.match(name)
+    if match:
+        return match.group("algo", "ndv") + (UNKNOWN,)
+    return (UNKNOWN, UNKNOWN, UNKNOWN)
+
+def provenancename(filename):
+    return re.sub("\.ref$", "", filename) + ".prov"
+
+def provenance_lines(filename):
+    """
+    Yield the provenance of each point, one line at a time
+    """
+    with open(filename, "r") as fp:
+        for line in fp:
+            if line.strip():
+                yield tuple(line.split())
+
+def read_provenance(filename):
+    return list(provenance_lines(filename))
+
+def write_provenance(archive, fp):
+    for tag in archive.tags:
+        fp.write(" ".join([str(field) for field in tag]))
+        fp.write("\n")
+
+def boundsname(filename):
+    return re.sub("\.ref$", "", filename) + ".bounds"
+
+def read_bounds(filename):
+    """
+    (best, worst) over all the rows of a bounds file
+    """
+    best = None
+    worst = None
+    with open(filename, "r") as fp:
+        fp.readline() # header
+        for line in fp:
+            fields = line.split()
+            if len(fields) != 3:
+                continue
+            low, high = [numpy.array(epsilon_list(field))
+                         for field in fields[1:]]
+            if best is None:
+                best, worst = low, high
+            else:
+                best = numpy.minimum(best, low)
+                worst = numpy.maximum(worst, high)
+    return best, worst
+
+def write_bounds(archive, label, fp):
+    fp.write("problem utopia nadir\n")
+    if (archive.minimum > archive.maximum).any():
+        return # nothing was read
+    fp.write("{0} {1} {2}\n".format(label,
+        ",".join([repr(float(val)) for val in archive.minimum]),
+        ",".join([repr(float(val)) for val in archive.maximum])))
+
+def widen(archive, filename):
+    """
+    Take in the bounds recorded beside a reference set.
+    Without them, the archive's bounds become unknown (NaN).
+    """
+    if not filename.endswith(".ref"):
+        return
+    sidecar = boundsname(filename)
+    best = None
+    if os.path.exists(sidecar):
+        best, worst = read_bounds(sidecar)
+    if best is None:
+        best = numpy.empty(len(archive.epsilons))
+        best.fill(numpy.nan)
+        worst = best
+    archive.widen(best, worst)
+
+def save_bounds(archive, filename):
+    """
+    Write the bounds beside filename, if they are known.  If
+    not, remove any old ones rather than leave them looking
+    current.
+    """
+    bounds = boundsname(filename)
+    if numpy.isnan(archive.minimum).any():
+        print "some inputs have no .bounds, not writing "\
+              "{0}".format(bounds)
+        if os.path.exists(bounds):
+            os.unlink(bounds)
+        return False
+    with open(bounds, "w") as fp:
+        write_bounds(archive, label(filename), fp)
+    return True
+
+def _entry(lines, ndv, nobj):
+    rows = [line.split() for line in lines]
+    width = ndv + nobj
+    if all([len(row) == width for row in rows]):
+        values = numpy.array(rows, dtype=float)
+        return ([tuple(row) for row in values[:, :ndv]],
+                values[:, ndv:])
+    variables = []
+    objectives = []
+    for row in rows:
+        if len(row) < nobj:
+            continue
+        if len(row) == width:
+            variables.append(tuple([float(val)
+                                    for val in row[:ndv]]))
+        else:
+            variables.append(())
+        objectives.append([float(val) for val in row[-nobj:]])
+    return variables, numpy.array(objectives).reshape(-1, nobj)
+
+def read_entries(filename, ndv, nobj, limit=None):
+    """
+    Yield (index, variables, objectives) for each set in a
+    file.  index counts the set terminators before the set,
+    so it is the set's number as hv reports it.  With limit,
+    a text set longer than limit rows, such as a whole
+    reference set, comes in pieces of at most limit rows,
+    each with the set's index.
+    """
+    if setsstore.is_store(filename):
+        store = setsstore.SetsStore(filename)
+        for index in range(len(store)):
+            objectives = store.read_set(index)
+            if store.ndv() == ndv and ndv > 0:
+                variables = [tuple(row) for row
+                             in store.read_set(index, True)[:, :ndv]]
+            else:
+                variables = [()] * len(objectives)
+            yield index, variables, objectives
+        return
+    index = 0
+    lines = []
+    with open(filename, "r") as fp:
+        for line in fp:
+            if line.startswith("#"):
+                if lines:
+                    yield (index,) + _entry(lines, ndv, nobj)
+                lines = []
+                if setsfile.SEPARATOR.match(line):
+                    index += 1
+            elif not line.startswith("//") and line.strip():
+                lines.append(line)
+                if len(lines) == limit:
+                    yield (index,) + _entry(lines, ndv, nobj)
+                    lines = []
+    if lines:
+        yield (index,) + _entry(lines, ndv, nobj)
+
+def read_sources(filename, ndv, nobj, limit=None):
+    """
+    Yield (variables, objectives, tags) for each set in a
+    file (in pieces, with limit, as for read_entries),
+    tagging each point with its provenance.
+    """
+    sidecar = provenancename(filename)
+    if filename.endswith(".ref") and os.path.exists(sidecar):
+        provenance = provenance_lines(sidecar)
+    else:
+        provenance = None
+    algo, algondv, seed = origin(filename)
+    for index, variables, objectives in read_entries(
+                                    filename, ndv, nobj, limit):
+        if provenance is None:
+            tags = [(algo, algondv, seed, index)] \
+                 * len(objectives)
+        else:
+            tags = list(itertools.islice(provenance,
+                                         len(objectives)))
+            if len(tags) < len(objectives):
+                msg = "{0} has fewer lines than {1}".format(
+                        sidecar, filename)
+                raise ProvenanceError(msg)
+        yield variables, objectives, tags
+
+def merge(filenames, ndv, epsilons, archive=None, limit=None):
+    """
+    Add every set in every file to an archive, limit rows
+    at most at a time.  Each point is tagged with its
+    provenance.
+    """
+    if archive is None:
+        archive = EpsilonBoxArchive(epsilons)
+    for filename in filenames:
+        for variables, objectives, tags in read_sources(
+                        filename, ndv, len(epsilons), limit):
+            archive.add(objectives, variables, tags)
+        widen(archive, filename)
+    return archive
+
+def leaf(task):
+    """
+    Epsilon-sort one file.  Points are tagged
+    key + (set, row, provenance).
+    """
+    key, filename, ndv, epsilons = task
+    archive = EpsilonBoxArchive(epsilons)
+    for entry, (variables, objectives, provenance) in enumerate(
+                read_sources(filename, ndv, len(epsilons))):
+        tags = [key + (entry, row, source) for row, source
+                in enumerate(provenance)]
+        archive.add(objectives, variables, tags)
+    widen(archive, filename)
+    return archive
+
+def join(task):
+    """
+    Merge two archives.  right's points are taken as
+    arriving after left's.
+    """
+    left, right = task
+    left.add(right.objectives, right.variables, right.tags)
+    left.widen(right.minimum, right.maximum)
+    return left
+
+def ordered(archive):
+    """
+    A copy of archive with its points in tag order
+    """
+    order = sorted(range(len(archive)),
+                   key=lambda index: archive.tags[index])
+    result = EpsilonBoxArchive(archive.epsilons)
+    result.restore(archive.objectives[order],
+                   [archive.variables[index] for index in order],
+                   [archive.tags[index] for index in order])
+    result.widen(archive.minimum, archive.maximum)
+    return result
+
+def reduce_groups(groups, mapper=map):
+    """
+    Reduce each group (a list of archives) to one archive,
+    merging pairs from every group in the same level
+    together.  Return a list of archives, one per group.
+    """
+    groups = [list(group) for group in groups]
+    while any([len(group) > 1 for group in groups]):
+        pairs = []
+        for group in groups:
+            pairs.extend(zip(group[0:-1:2], group[1::2]))
+        joined = iter(mapper(join, pairs))
+        for number, group in enumerate(groups):
+            odd = group[-1:] if len(group) % 2 else []
+            groups[number] = [joined.next() for _
+                              in range(len(group) // 2)] + odd
+    return [group[0] for group in groups]
+
+def tree_merge_groups(groups, ndv, epsilons, processes=None):
+    """
+    groups: lists of filenames.  Return one archive per
+    group, each in the order merge would give and tagged
+    with provenance as merge would tag it.
+    """
+    tasks = []
+    for number, filenames in enumerate(groups):
+        for position, filename in enumerate(filenames):
+            tasks.append(((number, position), filename, ndv,
+                          epsilons))
+    if processes is None or processes == 1:
+        pool = None
+        mapper = map
+    else:
+        pool = multiprocessing.Pool(processes)
+        mapper = lambda function, items: pool.map(
+                                function, items, chunksize=1)
+    try:
+        leaves = iter(mapper(leaf, tasks))
+        archives = [[leaves.next() for _ in filenames]
+                    for filenames in groups]
+        empty = EpsilonBoxArchive(epsilons)
+        archives = [group or [empty] for group in archives]
+        results = [ordered(archive) for archive
+                   in reduce_groups(archives, mapper)]
+        for archive in results:
+            archive.tags = [tag[-1] for tag in archive.tags]
+        return results
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+def combine_groups(groups, mapper=map):
+    """
+    Merge each group of archives as a reduction tree,
+    taking each archive's points as arriving after the ones
+    before it.  Pairs from every group are merged in the
+    same level.  Return one archive per group.
+    """
+    groups = [list(group) for group in groups]
+    for group in groups:
+        for number, archive in enumerate(group):
+            archive.tags = [(number, row, tag) for row, tag
+                            in enumerate(archive.tags)]
+    results = [ordered(archive) for archive
+               in reduce_groups(groups, mapper)]
+    for archive in results:
+        archive.tags = [tag[-1] for tag in archive.tags]
+    return results
+
+def combine(archives, mapper=map):
+    """
+    Merge archives as a reduction tree, taking each one's
+    points as arriving after the ones before it.
+    """
+    return combine_groups([archives], mapper)[0]
+
+def tree_merge(filenames, ndv, epsilons, processes=None):
+    """
+    merge, done as a reduction tree
+    """
+    return tree_merge_groups([filenames], ndv, epsilons,
+                             processes)[0]
+
+def write_archive(archive, fp):
+    for variables, objectives in archive.rows():
+        values = list(variables) + list(objectives)
+        fp.write(" ".join([javadouble(val) for val in values]))
+        fp.write("\n")
+
+def label(filename):
+    """
+    What a bounds file calls the problem of a reference set
+    """
+    return re.sub("\.ref$", "", os.path.basename(filename))
+
+def epsilon_list(text):
+    return [float(val) for val in text.split(",")]
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputs", nargs="*",
+                        help="sets files or reference sets")
+    parser.add_argument("-l", "--list", type=argparse.FileType("r"),
+                        help="file naming more inputs, one per "\
+                             "line, or - for standard input")
+    parser.add_argument("-d", "--dimension", type=int,
+                        required=True,
+                        help="number of objectives")
+    parser.add_argument("-e", "--epsilon", type=epsilon_list,
+                        required=True,
+                        help="epsilons, e1,e2,...")
+    parser.add_argument("-o", "--output", required=True,
+                        help="file for the merged set")
+    parser.add_argument("-v", "--vars", type=int, required=True,
+                        help="number of decision variables")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="merge as a reduction tree in "\
+                             "this many processes")
+    parser.add_argument("-b", "--bounds", action="store_true",
+                        help="write the best and worst of each "\
+                             "objective beside the output")
+    parser.add_argument("-p", "--provenance",
+                        action="store_true",
+                        help="write where each point came "\
+                             "from beside the output")
+    parser.add_argument("-m", "--memory", type=float,
+                        help="megabytes to hold points in, "\
+                             "spilling to disk beyond that")
+    parser.add_argument("-t", "--tmpdir",
+                        help="where to spill, with --memory")
+    return parser.parse_args()
+
+def write_pieces(pieces, output, provenance):
+    """
+    Write a merged set, given as a series of archives, and
+    optionally its provenance.
+    """
+    provfp = None
+    if provenance:
+        provfp = open(provenancename(output), "w")
+    with open(output, "w") as fp:
+        for piece in pieces:
+            write_archive(piece, fp)
+            if provfp is not None:
+                write_provenance(piece, provfp)
+    if provfp is not None:
+        provfp.close()
+
+def cli():
+    args = get_args()
+    if len(args.epsilon) != args.dimension:
+        print "{0} epsilons for {1} objectives".format(
+                len(args.epsilon), args.dimension)
+        return
+    inputs = list(args.inputs)
+    if args.list is not None:
+        inputs.extend([line.strip() for line in args.list
+                       if line.strip()])
+    if not inputs:
+        print "No inputs"
+        return
+    if args.memory is not None and args.jobs is not None:
+        print "--memory and --jobs can't be used together"
+        return
+    if args.memory is not None:
+        archive = spill.SpillArchive(
+                        args.epsilon,
+                        spill.capacity(args.memory, args.vars,
+                                       args.dimension),
+                        args.tmpdir)
+        try:
+            merge(inputs, args.vars, args.epsilon, archive,
+                  max(1, archive.capacity // 4))
+            write_pieces(archive.pieces(), args.output,
+                         args.provenance)
+        finally:
+            archive.close()
+    else:
+        if args.jobs is None:
+            archive = merge(inputs, args.vars, args.epsilon)
+        else:
+            archive = tree_merge(inputs, args.vars, args.epsilon,
+                                 args.jobs)
+        write_pieces([archive], args.output, args.provenance)
+    if args.bounds:
+        save_bounds(archive, args.output)
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=68:number:fdm=indent
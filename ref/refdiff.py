@@ -0,0 +1,252 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+refdiff.py
+Compare two generations of a reference set, to tell whether
+the metrics computed against the old one are stale.
+
+Points are matched by epsilon box: each point's box is
+hashed, so the comparison costs one pass over each file.
+A box only in the new set holds an added point, a box only
+in the old set a removed one, and a box in both whose
+points differ holds points that moved within their box.
+
+The metrics are computed on objectives normalized to the
+bounds of the reference set, so if its best or worst value
+in any objective moved, every metric is stale, Hypervolume
+included.  Otherwise only the metrics that measure distance
+to the reference points (everything but Hypervolume and
+Spacing) are stale, and only if a point was added, removed
+or moved.  The bounds that broaden_refset.py uses for its
+axial points, from the .bounds files beside the reference
+sets (see merge.py), are compared as well, since they set
+the hypervolume reference point of an extended set.
+
+The exit status says what's stale: 0 if nothing, 10 if the
+points changed but not the bounds, so Hypervolume can be
+kept, 11 if the bounds moved, and 12 if the sets couldn't be
+read or compared.  Any other status, such as 1 from an
+uncaught exception or 2 from a bad command line, is a
+failure too, and says nothing about the sets.
+"""
+import os
+import re
+import sys
+import argparse
+import collections
+import numpy
+import merge
+import combine_refsets
+
+# metrics that depend on the reference points themselves,
+# not just on the bounds
+DISTANCE_METRICS = ["GenerationalDistance",
+                    "InvertedGenerationalDistance",
+                    "EpsilonIndicator",
+                    "MaximumParetoFrontError"]
+ALL_METRICS = ["Hypervolume"] + DISTANCE_METRICS + ["Spacing"]
+
+PROBLEM = re.compile("(?P<nobj>[0-9]+)_(?P<eps>[0-9.]+)\.ref$")
+
+# exit statuses, clear of Python's 1 and argparse's 2
+UNCHANGED = 0
+POINTS_CHANGED = 10
+BOUNDS_MOVED = 11
+INCOMPARABLE = 12
+
+class EpsilonError(Exception):
+    pass
+
+def problem_epsilons(filename):
+    """
+    Epsilons for a reference set named the usual way,
+    ALGO_NDV_NOBJ_EPS.ref or m.NOBJ_EPS.ref
+    """
+    match = PROBLEM.search(os.path.basename(filename))
+    try:
+        return merge.epsilon_list(combine_refsets.epsilons(
+                    match.group("nobj"), match.group("eps")))
+    except (AttributeError, KeyError):
+        msg = "no epsilons known for {0}".format(filename)
+        raise EpsilonError(msg)
+
+def read_objectives(filename, nobj):
+    """
+    Every point of a reference set, the last nobj values of
+    each row.
+    """
+    blocks = [objectives for _, _, objectives
+              in merge.read_entries(filename, 0, nobj)]
+    if not blocks:
+        return numpy.empty((0, nobj))
+    return numpy.vstack(blocks)
+
+def boxes(objectives, epsilons):
+    """
+    Map each epsilon box, hashed as the bytes of its
+    indices, to the points in it, in file order.
+    """
+    indices = numpy.floor(objectives
+                          / numpy.asarray(epsilons)).astype(int)
+    found = collections.OrderedDict()
+    for index, point in zip(indices, objectives):
+        found.setdefault(index.tostring(), []).append(
+                    point.tostring())
+    return found
+
+def bounds(objectives):
+    if len(objectives) == 0:
+        return None
+    return objectives.min(0), objectives.max(0)
+
+def same_bounds(old, new):
+    if old is None or new is None:
+        return old is None and new is None
+    return all([(before == after).all() for before, after
+                in zip(old, new)])
+
+def sidecar_bounds(filename):
+    sidecar = merge.boundsname(filename)
+    if not os.path.exists(sidecar):
+        return None
+    found = merge.read_bounds(sidecar)
+    if found[0] is None:
+        return None
+    return found
+
+class Delta(object):
+    """
+    What changed between two reference sets
+    """
+    def __init__(self, old, new, epsilons):
+        nobj = len(epsilons)
+        before = read_objectives(old, nobj)
+        after = read_objectives(new, nobj)
+        self.sizes = (len(before), len(after))
+        oldboxes = boxes(before, epsilons)
+        newboxes = boxes(after, epsilons)
+        self.removed = [point for key in oldboxes
+                        if key not in newboxes
+                        for point in oldboxes[key]]
+        self.added = [point for key in newboxes
+                      if key not in oldboxes
+                      for point in newboxes[key]]
+        self.moved = [point for key in newboxes
+                      if key in oldboxes and sorted(
+                            oldboxes[key]) != sorted(newboxes[key])
+                      for point in newboxes[key]]
+        self.bounds = (bounds(before), bounds(after))
+        self.sidecars = (sidecar_bounds(old), sidecar_bounds(new))
+
+    def points_changed(self):
+        return bool(self.added or self.removed or self.moved)
+
+    def bounds_moved(self):
+        return not same_bounds(*self.bounds) \
+            or not same_bounds(*self.sidecars)
+
+    def stale(self):
+        """
+        Metrics that need recomputing
+        """
+        if self.bounds_moved():
+            return ALL_METRICS
+        if self.points_changed():
+            return DISTANCE_METRICS
+        return []
+
+    def status(self):
+        if self.bounds_moved():
+            return BOUNDS_MOVED
+        if self.points_changed():
+            return POINTS_CHANGED
+        return UNCHANGED
+
+def format_point(point):
+    return " ".join([repr(float(val)) for val
+                     in numpy.fromstring(point)])
+
+def format_bounds(found):
+    if found is None:
+        return "none"
+    return " ".join([",".join([repr(float(val)) for val in end])
+                     for end in found])
+
+def report(delta, old, new, fp):
+    fp.write("{0}: {1} points\n".format(old, delta.sizes[0]))
+    fp.write("{0}: {1} points\n".format(new, delta.sizes[1]))
+    fp.write("added {0} removed {1} moved {2}\n".format(
+                len(delta.added), len(delta.removed),
+                len(delta.moved)))
+    for name, (before, after) in [("bounds", delta.bounds),
+                                  ("utopia-nadir",
+                                   delta.sidecars)]:
+        if same_bounds(before, after):
+            fp.write("{0} same\n".format(name))
+        else:
+            fp.write("{0} moved from {1} to {2}\n".format(
+                        name, format_bounds(before),
+                        format_bounds(after)))
+    fp.write("stale {0}\n".format(
+                ",".join(delta.stale()) or "none"))
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old", help="earlier reference set")
+    parser.add_argument("new", help="later reference set")
+    parser.add_argument("-e", "--epsilon",
+                        type=merge.epsilon_list,
+                        help="epsilons, e1,e2,...; by default "\
+                             "from the name of the new set")
+    parser.add_argument("-p", "--points", action="store_true",
+                        help="also list added (+), moved "\
+                             "(~) and removed (-) points")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only set the exit status")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    epsilons = args.epsilon
+    if epsilons is None:
+        try:
+            epsilons = problem_epsilons(args.new)
+        except EpsilonError as err:
+            print "{0}; give --epsilon".format(err)
+            sys.exit(INCOMPARABLE)
+    try:
+        delta = Delta(args.old, args.new, epsilons)
+    except (IOError, OSError, ValueError,
+            merge.ProvenanceError) as err:
+        print "can't compare {0} and {1}: {2}".format(
+                args.old, args.new, err)
+        sys.exit(INCOMPARABLE)
+    if not args.quiet:
+        report(delta, args.old, args.new, sys.stdout)
+        if args.points:
+            for sign, points in [("+", delta.added),
+                                 ("~", delta.moved),
+                                 ("-", delta.removed)]:
+                for point in points:
+                    print "{0} {1}".format(sign,
+                                           format_point(point))
+    sys.exit(delta.status())
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=68:number:fdm=indent
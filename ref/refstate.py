@@ -0,0 +1,371 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+refstate.py
+Keep a reference set up to date as seeds finish, instead of
+merging everything again.  The state for m.{NOBJ}_{EPS}.ref
+is m.{NOBJ}_{EPS}.state, which holds the epsilon archive,
+where each of its points came from (file, set, row), and how
+much of each input has been folded in.
+
+Sets files (.sets) and stores are folded in a set at a
+time, so a file that has grown since last time only has its
+new sets read.  Only complete sets are folded, so a sets
+file still writing its first set contributes nothing yet.
+Any other file, such as another reference set, is folded
+whole whenever it grows; folding points already in the
+archive changes nothing.
+
+The state also keeps a digest of what was folded from each
+input: the first and last sets folded, or the first and last
+64 KiB of any other file.  If an input changed other than by
+growing, its old points may no longer belong in the archive,
+so the state is rebuilt by folding every input again.
+
+After folding, the reference set is rewritten, along with
+its bounds (m.{NOBJ}_{EPS}.bounds, see merge.py) if every
+reference set folded in had bounds of its own, and the
+points that were displaced are written to
+m.{NOBJ}_{EPS}.displaced with their origins, so that only
+the hypervolumes that depended on them need recomputing.
+"""
+import os
+import sys
+import hashlib
+import argparse
+import numpy
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "hv"))
+import setsfile
+import setsindex
+import setsstore
+import merge
+import combine_refsets
+from archive import EpsilonBoxArchive
+
+class StateFormatError(Exception):
+    pass
+
+class InputRewrittenError(Exception):
+    pass
+
+# bytes digested at each end of a file folded whole
+BLOCK = 2**16
+
+def file_ndv(path, nobj):
+    """
+    How many decision variables a sets file's rows carry
+    """
+    if setsstore.is_store(path):
+        return setsstore.SetsStore(path).ndv()
+    with open(path, "r") as fp:
+        for line in fp:
+            if setsfile.DATA.match(line):
+                return len(line.split()) - nobj
+    return 0
+
+def stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+def is_sets(path):
+    """
+    Whether path is folded a set at a time
+    """
+    return setsstore.is_store(path) or path.endswith(".sets")
+
+def _ends(done):
+    """
+    The first and last of done sets
+    """
+    if done == 0:
+        return []
+    return sorted(set([0, done - 1]))
+
+def fingerprint(path, done, size):
+    """
+    A digest of what was folded from path: the first and
+    last of done sets, or the ends of the first size bytes of
+    a file folded whole.  None if path is no longer that
+    long.
+    """
+    sha = hashlib.sha1()
+    if setsstore.is_store(path):
+        store = setsstore.SetsStore(path)
+        if len(store) < done:
+            return None
+        for index in _ends(done):
+            sha.update(numpy.ascontiguousarray(
+                            store.read_set(index)).tostring())
+        return sha.hexdigest()
+    if is_sets(path):
+        idx = setsindex.index(path)
+        if len(idx) < done:
+            return None
+        spans = [(idx.offsets[index], idx.lengths[index])
+                 for index in _ends(done)]
+    else:
+        if os.path.getsize(path) < size:
+            return None
+        spans = [(0, min(size, BLOCK)),
+                 (max(0, size - BLOCK), min(size, BLOCK))]
+    with open(path, "rb") as fp:
+        for offset, length in spans:
+            fp.seek(offset)
+            sha.update(fp.read(length))
+    return sha.hexdigest()
+
+class RefState(object):
+    """
+    ndv: decision variables to keep with each point, as
+    with merge.py's --vars.  Points from files with a
+    different number keep none.
+    """
+    def __init__(self, epsilons, ndv=0):
+        self.epsilons = list(epsilons)
+        self.ndv = ndv
+        self.archive = EpsilonBoxArchive(epsilons)
+        # path: [sets folded, size, mtime, fingerprint]
+        self.inputs = {}
+
+    def nobj(self):
+        return len(self.epsilons)
+
+    def _fold(self, path, index, variables, objectives):
+        tags = [(path, index, row) for row
+                in range(len(objectives))]
+        self.archive.add(objectives, variables, tags)
+
+    def rewritten(self, path):
+        """
+        Whether what was folded from path has changed other
+        than by growing
+        """
+        if path not in self.inputs or not os.path.exists(path):
+            return False
+        done, size, mtime, digest = self.inputs[path]
+        if (size, mtime) == stamp(path):
+            return False
+        return digest is None \
+            or fingerprint(path, done, size) != digest
+
+    def rebuilt(self):
+        """
+        A new state with every input that still exists
+        folded in again
+        """
+        state = RefState(self.epsilons, self.ndv)
+        for path in sorted(self.inputs):
+            if os.path.exists(path):
+                state.fold(path)
+            else:
+                print "{0} is gone, dropping its points".format(
+                        path)
+        return state
+
+    def _record(self, path, done):
+        size = stamp(path)[0]
+        self.inputs[path] = [done] + list(stamp(path)) \
+                          + [fingerprint(path, done, size)]
+
+    def fold(self, path):
+        """
+        Fold in whatever of path hasn't been folded yet.
+        Return the number of sets read.
+        """
+        nobj = self.nobj()
+        if self.rewritten(path):
+            msg = "{0} was rewritten, rebuild the state".format(
+                    path)
+            raise InputRewrittenError(msg)
+        done, size, mtime, _ = self.inputs.get(path,
+                                               [0, -1, -1, None])
+        if (size, mtime) == stamp(path):
+            return 0
+        if not is_sets(path): # a reference set: fold it whole
+            for _, variables, objectives in merge.read_entries(
+                                        path, self.ndv, nobj):
+                self._fold(path, 0, variables, objectives)
+            merge.widen(self.archive, path)
+            self._record(path, 0)
+            return 1
+        ndv = file_ndv(path, nobj)
+        keep = ndv == self.ndv and ndv > 0
+        if setsstore.is_store(path):
+            store = setsstore.SetsStore(path)
+            sets = store.read_sets(done, variables=keep)
+            total = len(store)
+        else:
+            idx = setsindex.index(path)
+            total = len(idx)
+            sets = idx.read_sets(ndv, nobj, done,
+                                 variables=True)
+        count = 0
+        for index, block in sets:
+            objectives = block[:, -nobj:]
+            if keep:
+                variables = [tuple(row) for row
+                             in block[:, :ndv]]
+            else:
+                variables = [()] * len(block)
+            self._fold(path, index, variables, objectives)
+            count += 1
+        self._record(path, total)
+        return count
+
+    def points(self):
+        """
+        The tags of the archived points
+        """
+        return set(self.archive.tags)
+
+    def save(self, filename):
+        partial = "{0}.{1}.partial".format(filename, os.getpid())
+        with open(partial, "w") as fp:
+            fp.write("# epsilons {0}\n".format(
+                    ",".join([repr(eps) for eps in self.epsilons])))
+            fp.write("# vars {0}\n".format(self.ndv))
+            minimum = self.archive.minimum
+            maximum = self.archive.maximum
+            # unknown (NaN) bounds are kept as such
+            if numpy.isnan(minimum).any() \
+                    or (minimum <= maximum).all():
+                fp.write("# bounds {0} {1}\n".format(
+                    ",".join([repr(float(val)) for val
+                              in minimum]),
+                    ",".join([repr(float(val)) for val
+                              in maximum])))
+            for path in sorted(self.inputs):
+                done, size, mtime, digest = self.inputs[path]
+                fp.write("# input {0} {1} {2!r} {3} {4}\n".format(
+                            done, size, mtime, digest or "-",
+                            path))
+            for (variables, objectives), tag in zip(
+                        self.archive.rows(), self.archive.tags):
+                path, index, row = tag
+                values = list(variables) + list(objectives)
+                fp.write("{0} {1} {2} {3} {4}\n".format(
+                            path, index, row, len(variables),
+                            " ".join([repr(float(val))
+                                      for val in values])))
+        os.rename(partial, filename)
+
+def load(filename):
+    """
+    Read a saved state.
+    """
+    state = None
+    objectives = []
+    variables = []
+    tags = []
+    with open(filename, "r") as fp:
+        for line in fp:
+            fields = line.split()
+            if line.startswith("# epsilons"):
+                state = RefState(merge.epsilon_list(fields[2]))
+            elif line.startswith("# vars"):
+                state.ndv = int(fields[2])
+            elif line.startswith("# bounds"):
+                state.archive.widen(merge.epsilon_list(fields[2]),
+                                    merge.epsilon_list(fields[3]))
+            elif line.startswith("# input"):
+                # states saved without fingerprints have
+                # the path in their place
+                digest = None
+                if len(fields) > 6 and fields[5] != "-":
+                    digest = fields[5]
+                state.inputs[fields[-1]] = [int(fields[2]),
+                                            int(fields[3]),
+                                            float(fields[4]),
+                                            digest]
+            elif fields:
+                if state is None:
+                    msg = "{0} has no epsilons".format(filename)
+                    raise StateFormatError(msg)
+                path, index, row, nvars = fields[:4]
+                values = [float(val) for val in fields[4:]]
+                nvars = int(nvars)
+                tags.append((path, int(index), int(row)))
+                variables.append(tuple(values[:nvars]))
+                objectives.append(values[nvars:])
+    state.archive.restore(numpy.array(objectives), variables,
+                          tags)
+    return state
+
+def write_displaced(fp, displaced):
+    """
+    One line per displaced point: file, set, row
+    """
+    for path, index, row in sorted(displaced):
+        fp.write("{0} {1} {2}\n".format(path, index, row))
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("nobj")
+    parser.add_argument("epsilon_scaling")
+    parser.add_argument("inputs", nargs="+",
+                        help="sets files, stores or reference "\
+                             "sets to fold in")
+    parser.add_argument("-v", "--vars", type=int, default=0,
+                        help="decision variables to keep, as "\
+                             "for merge.py")
+    parser.add_argument("-o", "--output_directory",
+                        default="/gpfs/scratch/mjw5407/task1/ref")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    reffile = combine_refsets.output_filename(
+                    None, None, args.nobj, args.epsilon_scaling,
+                    args.output_directory)
+    base = reffile[:-len(".ref")]
+    statefile = base + ".state"
+    if os.path.exists(statefile):
+        state = load(statefile)
+    else:
+        state = RefState(merge.epsilon_list(
+                            combine_refsets.epsilons(
+                                args.nobj, args.epsilon_scaling)),
+                         args.vars)
+    before = state.points()
+    rewritten = [path for path in sorted(state.inputs)
+                 if state.rewritten(path)]
+    if rewritten:
+        print "rewritten since last time, rebuilding:"
+        print "\n".join(rewritten)
+        state = state.rebuilt()
+    for path in args.inputs:
+        print "{0}: {1} sets".format(path, state.fold(path))
+    after = state.points()
+    displaced = before - after
+    state.save(statefile)
+    with open(reffile, "w") as fp:
+        merge.write_archive(state.archive, fp)
+    merge.save_bounds(state.archive, reffile)
+    with open(base + ".displaced", "w") as fp:
+        write_displaced(fp, displaced)
+    print "{0} points, {1} new, {2} displaced".format(
+            len(after), len(after - before), len(displaced))
+    affected = sorted(set([path for path, _, _ in displaced]))
+    if affected:
+        print "displaced points came from:"
+        print "\n".join(affected)
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=68:number:fdm=indent
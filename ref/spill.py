@@ -0,0 +1,226 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+spill.py
+An epsilon-box archive that keeps no more than a fixed
+number of points in memory, for merges too big for one
+(see merge.py --memory).
+
+Points go into an ordinary archive.  When it grows past
+its capacity, it is written to disk as a run, and a new one
+is started.  Each run is an archive of the points that
+arrived while it was open, so the merged archive is the
+points of every run that no point of another run rejects:
+what survives doesn't depend on the order points arrive in,
+and anything that rejects a point that didn't survive
+rejects the points it would have rejected too.  Of two
+equally good points in the same box, the one from the
+earlier run wins.
+
+So that runs needn't be checked against each other, the
+objectives of the spilled points that no later point has
+rejected are kept in memory as an index.  Arriving points
+the index rejects are dropped before they reach the open
+run, and each run, as it spills, drops the indexed points it
+rejects.  At the end, what is left in the index is what
+survives, and the runs are read back once, a piece at a
+time, keeping those points, in the order a merge in memory
+would give.  The index holds no more points than the merged
+archive, and costs a small fraction of what a point in the
+open run does, so it is not counted against the budget.
+
+A run is a text file with one point per line: the number of
+decision variables, the number of tag fields, then the
+variables and objectives (repr'd) and the tag.  Tags come
+back as strings, which is how provenance is written anyway.
+"""
+import os
+import shutil
+import tempfile
+import numpy
+from archive import EpsilonBoxArchive, corner_distance
+
+# Rough bytes per point held: objectives and boxes as
+# arrays, copied while the archive grows, plus the Python
+# objects behind its tag.  Each decision variable costs a
+# float object and a pointer.
+OVERHEAD = 400
+PER_VARIABLE = 32
+PER_OBJECTIVE = 40
+
+def capacity(megabytes, ndv, nobj):
+    """
+    How many points to keep in memory for a budget of
+    megabytes.  Half the budget is kept for the pieces
+    being checked and read back.
+    """
+    perpoint = OVERHEAD + PER_VARIABLE * ndv \
+             + PER_OBJECTIVE * nobj
+    return max(1, int(megabytes * 2 ** 20) // (2 * perpoint))
+
+def write_run(archive, fp):
+    for (variables, objectives), tag in zip(archive.rows(),
+                                            archive.tags):
+        values = list(variables) + list(objectives)
+        fp.write("{0} {1} {2} {3}\n".format(
+                    len(variables), len(tag),
+                    " ".join([repr(float(val)) for val in values]),
+                    " ".join([str(field) for field in tag])))
+
+def read_run(filename, nobj, limit=None):
+    """
+    Yield (objectives, variables, tags) for the points of a
+    run, at most limit at a time.
+    """
+    objectives = []
+    variables = []
+    tags = []
+    with open(filename, "r") as fp:
+        for line in fp:
+            fields = line.split()
+            nvars = int(fields[0])
+            ntag = int(fields[1])
+            values = [float(val) for val
+                      in fields[2:len(fields) - ntag]]
+            variables.append(tuple(values[:nvars]))
+            objectives.append(values[nvars:])
+            tags.append(tuple(fields[len(fields) - ntag:]))
+            if len(tags) == limit:
+                yield (numpy.array(objectives).reshape(-1, nobj),
+                       variables, tags)
+                objectives, variables, tags = [], [], []
+    if tags:
+        yield (numpy.array(objectives).reshape(-1, nobj),
+               variables, tags)
+
+class SpillArchive(object):
+    """
+    capacity: points kept in memory before spilling a run.
+    directory: where to put the runs, by default a new
+    temporary directory, removed by close().
+    """
+    def __init__(self, epsilons, capacity, directory=None):
+        self.epsilons = list(epsilons)
+        self.capacity = capacity
+        self.archive = EpsilonBoxArchive(epsilons)
+        self.directory = tempfile.mkdtemp(prefix="spill",
+                                          dir=directory)
+        # (filename, number of its first point) for each run
+        self.runs = []
+        # the spilled points no later point has rejected,
+        # objectives only, tagged with their numbers
+        self.index = EpsilonBoxArchive(epsilons)
+        self.spilled = 0
+
+    @property
+    def minimum(self):
+        return self.archive.minimum
+
+    @property
+    def maximum(self):
+        return self.archive.maximum
+
+    def widen(self, minimum, maximum):
+        self.archive.widen(minimum, maximum)
+
+    def add(self, objectives, variables=None, tags=None):
+        objectives = numpy.asarray(objectives, dtype=float)
+        if objectives.ndim == 1:
+            objectives = objectives.reshape(1, -1)
+        if variables is None:
+            variables = [()] * len(objectives)
+        if tags is None:
+            tags = [None] * len(objectives)
+        if len(objectives) and len(self.index):
+            # only what no spilled point rejects goes in
+            self.archive.widen(objectives.min(0),
+                               objectives.max(0))
+            boxes = self.index.box(objectives)
+            distances = numpy.array([
+                        corner_distance(obj, box, self.epsilons)
+                        for obj, box in zip(objectives, boxes)])
+            keep = numpy.nonzero(~self.index.rejected(
+                                        boxes, distances))[0]
+            objectives = objectives[keep]
+            variables = [variables[index] for index in keep]
+            tags = [tags[index] for index in keep]
+        accepted = self.archive.add(objectives, variables, tags)
+        if len(self.archive) > self.capacity:
+            self.spill()
+        return accepted
+
+    def spill(self):
+        """
+        Write the open run to disk, drop the spilled points
+        it rejects from the index and add its own, and start
+        another run
+        """
+        filename = os.path.join(self.directory, "{0}.run".format(
+                                    len(self.runs)))
+        with open(filename, "w") as fp:
+            write_run(self.archive, fp)
+        run = self.archive
+        if len(self.index):
+            self.index.keep(~run.rejected(self.index.boxes,
+                                          self.index.distances,
+                                          ties=False))
+        count = len(run)
+        self.index.restore(run.objectives, [()] * count,
+                           range(self.spilled,
+                                 self.spilled + count))
+        self.runs.append((filename, self.spilled))
+        self.spilled += count
+        archive = EpsilonBoxArchive(self.epsilons)
+        archive.widen(run.minimum, run.maximum)
+        self.archive = archive
+
+    def _piece(self, objectives, variables, tags):
+        piece = EpsilonBoxArchive(self.epsilons)
+        piece.restore(objectives, variables, tags)
+        return piece
+
+    def pieces(self):
+        """
+        Yield the merged archive as a series of archives,
+        each at most half the capacity, in order.
+        """
+        if not self.runs:
+            yield self.archive
+            return
+        if len(self.archive):
+            self.spill()
+        alive = numpy.array(self.index.tags, dtype=numpy.int64)
+        nobj = len(self.epsilons)
+        step = max(1, self.capacity // 2)
+        for filename, first in self.runs:
+            for objectives, variables, tags in read_run(
+                                        filename, nobj, step):
+                numbers = first + numpy.arange(len(tags))
+                first += len(tags)
+                place = numpy.minimum(
+                            numpy.searchsorted(alive, numbers),
+                            len(alive) - 1)
+                keep = numpy.nonzero(alive[place] == numbers)[0]
+                yield self._piece(objectives[keep],
+                                  [variables[index]
+                                   for index in keep],
+                                  [tags[index] for index in keep])
+
+    def close(self):
+        shutil.rmtree(self.directory, True)
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=68:number:fdm=indent
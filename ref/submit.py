@@ -16,7 +16,16 @@ along with this script. If not, see <http://www.gnu.org/licenses/>.
 
 ===========================================================
 submit.py
-Submit reference set computations as PBS jobs
+Submit reference set computations as PBS jobs.  Each job
+runs merge.py, or with --java, PSOResultFileMerger.  With
+--jobs, merge.py merges the seeds as a reduction tree on
+that many cores, and with --memory, it holds no more than
+that many megabytes of points, spilling the rest to disk.
+merge.py writes each point's seed and set, and the bounds
+of the objectives, beside the reference set, for
+combine_refsets.py to carry on.  Its inputs are listed on
+its standard input rather than its command line, however
+many seeds there are.
 """
 
 from subprocess import Popen, PIPE
@@ -27,6 +36,10 @@ import sys
 import argparse
 import time
 from collections import namedtuple
+REFDIR = os.path.dirname(os.path.abspath(__file__))
+HVDIR = os.path.join(REFDIR, "..", "hv")
+sys.path.append(HVDIR)
+import setsstore
 
 class InvalidProblemError(Exception): pass
 
@@ -35,7 +48,8 @@ class Job(object):
     Job: generate a reference set from the 50 seeds for
     a particular algo/problem.
     """
-    def __init__(self, algo, problem, inputdir, outputdir):
+    def __init__(self, algo, problem, inputdir, outputdir,
+                 java=False, cores=None, memory=None):
         """
         figure out what epsilons are and what the problem name
         is.  
@@ -54,6 +68,9 @@ class Job(object):
         self.inputdir = os.path.join(
                                 inputdir,"_".join([algo,problem]))
         self.outputdir = outputdir
+        self.java = java
+        self.cores = cores
+        self.memory = memory
         self.outputfile = os.path.join(self.outputdir, 
                                        "{0}.ref".format(self.name))
 
@@ -61,6 +78,8 @@ class Job(object):
         """
         Build a PBS script for the job
         """
+        if not self.java:
+            return self.native_script()
         classpath = ["./lib/{0}".format(fn) for fn 
                      in os.listdir("lib") 
                      if re.search("\.jar$", fn)
@@ -69,9 +88,19 @@ class Job(object):
         java_args = "-Xmx1g -server -classpath {0}".format(
             ":".join(classpath))
 
-        inputs = [os.path.join(self.inputdir, fn) 
-                  for fn in os.listdir(self.inputdir)
-                  if re.search("\.sets$", fn)]
+        # the Java merger reads only text, so stores are
+        # exported to scratch space first
+        inputs = []
+        exports = []
+        for fn in setsstore.find_sets(self.inputdir):
+            if setsstore.is_store(fn):
+                text = os.path.join("$TMPDIR", os.path.basename(
+                                        setsstore.textname(fn)))
+                exports.append("python {0} {1} -x {2}".format(
+                    os.path.join(HVDIR, "setsstore.py"), fn, text))
+                inputs.append(text)
+            elif re.search("\.sets$", fn):
+                inputs.append(fn)
               
         merger = "PSOResultFileMerger"
         merger_args = [
@@ -92,13 +121,51 @@ class Job(object):
             "#PBS -l walltime=24:00:00",
             "#PBS -o {0}".format(os.path.join("output",self.name)),
             "#PBS -e {0}".format(os.path.join("error",self.name)),
-            "cd $PBS_O_WORKDIR",
+            "cd $PBS_O_WORKDIR"] + exports + [
             "java {0} {1} {2}".format(
                 java_args, merger, " ".join(merger_args))
             ]
                        
         return script
 
+    def native_script(self):
+        """
+        A PBS script that merges with merge.py, which reads
+        binary stores directly.
+        """
+        inputs = setsstore.find_sets(self.inputdir)
+        merger_args = [
+            "--dimension",
+            str(len(self.epsilons.split(","))),
+            "--epsilon",
+            self.epsilons,
+            "--vars",
+            self.ndvs,
+            "--output",
+            self.outputfile,
+            "--provenance",
+            "--bounds",
+            "--list",
+            "-"
+            ]
+        if self.cores is not None:
+            merger_args.extend(["--jobs", str(self.cores)])
+        if self.memory is not None:
+            merger_args.extend(["--memory", str(self.memory),
+                                "--tmpdir", "$TMPDIR"])
+        script = [
+            "#PBS -N {0}".format(self.name),
+            "#PBS -l nodes=1:ppn={0}".format(self.cores or 1),
+            "#PBS -l walltime=24:00:00",
+            "#PBS -o {0}".format(os.path.join("output",self.name)),
+            "#PBS -e {0}".format(os.path.join("error",self.name)),
+            "cd $PBS_O_WORKDIR",
+            "python {0} {1} <<EOF".format(
+                os.path.join(REFDIR, "merge.py"),
+                " ".join(merger_args))
+            ] + inputs + ["EOF"]
+        return script
+
     def submit(self):
         script = self.pbs_script()
         child = Popen("qsub", stdin=PIPE, stdout=PIPE)
@@ -136,14 +203,25 @@ def get_args():
                        )
     parser.add_argument("-v", "--verbose",
                         action='store_true')
+    parser.add_argument("--java", action='store_true',
+                        help="merge with PSOResultFileMerger "\
+                             "instead of merge.py")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="cores per job, for merge.py "\
+                             "to merge on in parallel")
+    parser.add_argument("-m", "--memory", type=float,
+                        help="megabytes of points for merge.py "\
+                             "to hold, spilling the rest to disk")
     args =  parser.parse_args()
     return args
 
-def jobs(algos, problems, inputdir, outputdir):
+def jobs(algos, problems, inputdir, outputdir, java=False,
+         cores=None, memory=None):
     thejobs = []
     for algo in algos:
         for problem in problems:
-            thejobs.append(Job(algo, problem, inputdir, outputdir))
+            thejobs.append(Job(algo, problem, inputdir, outputdir,
+                               java, cores, memory))
     return thejobs
 
 def cli():
@@ -164,7 +242,8 @@ def cli():
             print "Problem {0} not among {1}".format(
                         problem, ", ".join(valid_problems))
             return
-    for job in jobs(algos, problems, args.inputdir, args.outputdir):
+    for job in jobs(algos, problems, args.inputdir, args.outputdir,
+                    args.java, args.jobs, args.memory):
         pbsid = job.submit()
         print "{0}: {1}".format(pbsid, job)
         if args.verbose:
@@ -0,0 +1,96 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+treemerge.py
+Merge a problem's reference sets for several algorithms at
+once, as one reduction tree (see merge.py --jobs).  Each
+algorithm's seeds are reduced to one archive, optionally
+written out as ALGO_PROBLEM.ref the way submit.py would,
+and those are reduced in turn to the combined reference set
+that combine_refsets.py would write from them.  Pairs from
+every algorithm are merged in the same pool, so the cores
+stay busy while the slower algorithms catch up.
+"""
+import os
+import sys
+import argparse
+import multiprocessing
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "hv"))
+import setsstore
+import merge
+import combine_refsets
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("problem",
+                        help="problem, NDV_NOBJ_EPS, for "\
+                             "instance 27_3_0.1")
+    parser.add_argument("-a", "--algos",
+                        default="Borg,eMOEA,NSGAII,eNSGAII,"\
+                                "GDE3,BorgRecency",
+                        help="comma-delimited algorithms, "\
+                             "merged in this order")
+    parser.add_argument("-i", "--inputdir",
+                        default="/gpfs/scratch/mjw5407/task1/sets",
+                        help="directory where algo_problem "\
+                             "subdirectories can be found")
+    parser.add_argument("-o", "--outputdir",
+                        default="/gpfs/scratch/mjw5407/task1/ref")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="processes to merge with")
+    parser.add_argument("-k", "--keep", action="store_true",
+                        help="also write each algorithm's "\
+                             "reference set")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    ndv, nobj, eps = args.problem.split("_")
+    epsilons = merge.epsilon_list(
+                    combine_refsets.epsilons(nobj, eps))
+    algos = args.algos.split(",")
+    groups = [setsstore.find_sets(os.path.join(
+                    args.inputdir, "_".join([algo, args.problem])))
+              for algo in algos]
+    archives = merge.tree_merge_groups(groups, int(ndv),
+                                       epsilons, args.jobs)
+    if args.keep:
+        for algo, archive in zip(algos, archives):
+            filename = os.path.join(args.outputdir,
+                                    "{0}_{1}.ref".format(
+                                        algo, args.problem))
+            with open(filename, "w") as fp:
+                merge.write_archive(archive, fp)
+            with open(merge.provenancename(filename), "w") as fp:
+                merge.write_provenance(archive, fp)
+            merge.save_bounds(archive, filename)
+    combined = merge.combine(archives)
+    outputfn = combine_refsets.output_filename(
+                    None, ndv, nobj, eps, args.outputdir)
+    with open(outputfn, "w") as fp:
+        merge.write_archive(combined, fp)
+    with open(merge.provenancename(outputfn), "w") as fp:
+        merge.write_provenance(combined, fp)
+    merge.save_bounds(combined, outputfn)
+    print "{0}: {1} points".format(outputfn, len(combined))
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=68:number:fdm=indent
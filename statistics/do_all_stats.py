@@ -18,55 +18,176 @@ along with this script. If not, see <http://www.gnu.org/licenses/>.
 
 do_all_stats.py
 
-Go into the metrics directory and hit all of the files 
-with all of the statistics.  
+Go into the metrics directory and hit all of the files
+with all of the statistics.
+
+Each algorithm's parameter tables ({algo}_Params and
+{algo}_Sobol) are read once and shared by all of its
+problems, and the files are summarized in a pool of
+processes.  Each file is summarized by set, and, unless
+--group is given without names, gridded by the group
+parameters.  Group names are patterns, matched against each
+algorithm's parameter names, since the population size is
+called different things by different algorithms.
+
+Each metrics file, joined to its parameterizations, is
+written as a table beside it (see tablestore.py), and read
+from there next time unless a source has changed.
 """
 from statistics import analyze, write_result
+from statistics import is_stat, is_bins
 import os
 import glob
 import re
-import pandas
+import argparse
+import multiprocessing
+import tablestore
+
+STATS = ["mean", "variance", "q10", "q50", "q90", "min",
+         "max"]
+
+# (parameters, parameterizations) for each algorithm, filled
+# before the pool starts so that the processes share it
+TABLES = {}
+
+class ParameterError(Exception):
+    pass
 
-metricsdir = "/gpfs/scratch/mjw5407/task1/hv"
-paramsdir = "./params"
-outputdir = "/gpfs/scratch/mjw5407/task1/stats"
+def parameter_files(paramsdir, algo):
+    return (os.path.join(paramsdir, algo+"_Sobol"),
+            os.path.join(paramsdir, algo+"_Params"))
 
-#datafiles = [os.path.join(metricsdir, fn) 
-#             for fn in os.listdir(metricsdir)
-#             if re.search("\.hv$", fn) and not
-#                re.search("^m\.", fn)]
+def parameter_tables(paramsdir, algo):
+    """
+    (parameter names, parameterizations) for algo, read
+    the first time they're asked for
+    """
+    key = (paramsdir, algo)
+    if key not in TABLES:
+        sobolfile, paramsfile = parameter_files(paramsdir,
+                                                algo)
+        parameterizations = tablestore.read_parameterizations(
+                                        sobolfile, paramsfile)
+        TABLES[key] = (parameterizations.columns.values,
+                       parameterizations)
+    return TABLES[key]
 
-datafiles = glob.glob(os.path.join(metricsdir, "*0.1.hv"))
+def algorithm(fn):
+    return os.path.basename(fn).split("_")[0]
 
-for fn in datafiles:
+def resolve(patterns, param_names):
+    """
+    The parameter each group pattern names
+    """
+    group = []
+    for pattern in patterns:
+        found = [name for name in param_names
+                 if re.search(pattern, name)]
+        if not found:
+            msg = "no parameter matches {0}".format(pattern)
+            raise ParameterError(msg)
+        group.append(found[0])
+    return group
+
+def process(task):
+    """
+    Summarize one metrics file, by set and gridded
+    """
+    fn, paramsdir, outputdir, stats, patterns, deltas, \
+        store = task
     print "processing {0}".format(fn)
-    data = pandas.read_table(fn, sep=" ")
-    algo = os.path.basename(fn).split("_")[0]
-    pfilename = os.path.join(paramsdir, algo+"_Params")
-    parameters = pandas.read_table(pfilename,
-        sep = " ", names = ["name", "low", "high"],
-        header = None)
-    param_names = parameters.name.values
-    parameterizations = pandas.read_table(
-        os.path.join(paramsdir, algo+"_Sobol"),
-        sep = " ", names = param_names,
-        header = None)
-    popsize = [name for name in param_names
-               if re.search("[Pp]opulationSize", name)][0]
-
-    data = data.join(parameterizations, on=["Set"],
-                     how="outer")
-
-    setresults = analyze(data, ["mean", "variance", "q10", 
-                             "q50", "q90", "min", "max"])
+    param_names, parameterizations = parameter_tables(
+                                    paramsdir, algorithm(fn))
+    sources = parameter_files(paramsdir, algorithm(fn))
+    if store:
+        data = tablestore.materialize(fn, parameterizations,
+                                      sources)
+    else:
+        data = tablestore.load(fn, parameterizations, sources)
+
+    setresults = analyze(data, stats)
     for result in setresults:
         write_result(fn, result, outputdir)
-    gridresults = analyze(data, ["mean", "variance", "q10", 
-                             "q50", "q90", "min", "max"],
-                              [popsize, "maxEvaluations"],
-                              [334, 333334])
-    for result in gridresults:
-        write_result(fn, result, outputdir)
+    if patterns:
+        gridresults = analyze(data, stats,
+                              resolve(patterns, param_names),
+                              deltas)
+        for result in gridresults:
+            write_result(fn, result, outputdir)
+    return fn
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("patterns", nargs="*",
+                        default=["*0.1.hv"],
+                        help="globs for the metrics files, "\
+                             "in the metrics directory")
+    parser.add_argument("-m", "--metrics-directory",
+                        default="/gpfs/scratch/mjw5407/"
+                                "task1/hv")
+    parser.add_argument("-p", "--params-directory",
+                        default="./params",
+                        help="where {algo}_Params and "\
+                             "{algo}_Sobol are")
+    parser.add_argument("-o", "--output-directory",
+                        default="/gpfs/scratch/mjw5407/"
+                                "task1/stats")
+    parser.add_argument("-s", "--stats", nargs="+",
+                        default = STATS, type = is_stat,
+                        help="statistics to compute")
+    parser.add_argument("-g", "--group", nargs="*",
+                        default=["[Pp]opulationSize",
+                                 "maxEvaluations"],
+                        help="patterns for the parameters "\
+                             "to grid by; none to "\
+                             "summarize by set only")
+    parser.add_argument("-d", "--deltas", nargs="+",
+                        default=[is_bins("334"),
+                                 is_bins("333334")],
+                        type = is_bins,
+                        help="grid boxes for the group "\
+                             "parameters, as for "\
+                             "statistics.py")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="files to summarize at once")
+    parser.add_argument("--no-store", action="store_true",
+                        help="don't write each file's joined "\
+                             "table (see tablestore.py)")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    datafiles = []
+    for pattern in args.patterns:
+        pattern = os.path.join(args.metrics_directory, pattern)
+        for fn in sorted(glob.glob(pattern)):
+            if fn not in datafiles:
+                datafiles.append(fn)
+    tasks = []
+    for fn in datafiles:
+        param_names, _ = parameter_tables(
+                        args.params_directory, algorithm(fn))
+        try:
+            resolve(args.group, param_names)
+        except ParameterError as err:
+            print "{0}: {1}".format(fn, err)
+            return
+        tasks.append((fn, args.params_directory,
+                      args.output_directory, args.stats,
+                      args.group, args.deltas,
+                      not args.no_store))
+    if args.jobs == 1:
+        map(process, tasks)
+        return
+    pool = multiprocessing.Pool(args.jobs)
+    try:
+        pool.map(process, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
 
+if __name__ == "__main__":
+    cli()
 
 # vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
@@ -24,14 +24,39 @@ Going out: stats: mean, quantile, variance
            grouped by parameterization
            grouped by some or all 2d combinations of 
            parameters
-           
+
+All the statistics are computed together by summarize, in
+one pass over each column: the rows are put in group order
+once, moments are accumulated per group in that order, and
+each column is sorted once within groups, which gives every
+quantile, the minimum and the maximum by indexing.  Missing
+values are skipped, as pandas skips them.  The result is
+one wide table, split into a table per statistic for
+writing.
+
+Gridded summaries bin each parameter with Bins, a whole
+column at a time: uniform boxes, explicit edges, or
+log-spaced boxes, which suit maxEvaluations.  Rows are
+grouped on the integer box numbers, and the grid_* columns
+written out are the lower edges of the boxes.
+
+With --chunk, the data is read a block of rows at a time,
+each block joined to the parameterizations and folded into
+running statistics per group (streaming.py), so only the
+statistics are held.  Quantiles are then estimated, to the
+rank error given by --error.
+
+The data joined to the parameterizations is read from its
+table (see tablestore.py) instead of the text when there is
+one made from the inputs as they are now; --store writes it.
 """
 import argparse
 import pandas
 import numpy
 import re
 import os
-import copy
+import streaming
+import tablestore
 
 def is_quantile(stat):
     return re.match("q[0-9][0-9]?$", stat)
@@ -45,6 +70,85 @@ def is_stat(stat):
         raise argparse.ArgumentTypeError(
                 "Invalid statistic {0}".format(stat))
 
+class Bins(object):
+    """
+    Grid boxes for one parameter: uniform widths of delta,
+    explicit edges, or log-spaced with width decades each.
+    Boxes are numbered with integer codes, and labelled with
+    their lower edges.
+    """
+    def __init__(self, delta=None, edges=None, decades=None):
+        self.delta = delta
+        self.edges = None
+        if edges is not None:
+            self.edges = numpy.array(sorted(edges),
+                                     dtype=float)
+        self.decades = decades
+
+    def codes(self, values):
+        """
+        (codes, binned): the box of each value, and whether
+        it falls in one at all.  Missing values don't, nor do
+        values outside explicit edges, nor values that
+        aren't positive on a log scale.
+        """
+        values = numpy.asarray(values, dtype=float)
+        with numpy.errstate(invalid="ignore",
+                            divide="ignore"):
+            if self.edges is not None:
+                edges = self.edges
+                binned = (values >= edges[0]) \
+                       & (values <= edges[-1])
+                # the last box includes its upper edge
+                found = numpy.searchsorted(edges, values,
+                                           side="right") - 1
+                found = numpy.minimum(found, len(edges) - 2)
+            elif self.decades is not None:
+                binned = values > 0
+                found = numpy.floor(numpy.log10(values)
+                                    / self.decades)
+            else:
+                binned = ~numpy.isnan(values)
+                found = numpy.floor(values / self.delta)
+        codes = numpy.zeros(len(values), dtype=numpy.int64)
+        codes[binned] = found[binned]
+        return codes, binned
+
+    def lower(self, codes):
+        """
+        Lower edges of the boxes numbered codes
+        """
+        codes = numpy.asarray(codes)
+        if self.edges is not None:
+            return self.edges[codes]
+        if self.decades is not None:
+            return 10.0 ** (codes * self.decades)
+        return codes.astype(float) * self.delta
+
+def is_bins(text):
+    """
+    DELTA, edges:E1,E2,... or log:DECADES
+    """
+    try:
+        if text.startswith("edges:"):
+            edges = [float(edge) for edge
+                     in text[len("edges:"):].split(",")]
+            if len(edges) < 2:
+                raise ValueError
+            return Bins(edges=edges)
+        if text.startswith("log:"):
+            decades = float(text[len("log:"):])
+            if decades <= 0:
+                raise ValueError
+            return Bins(decades=decades)
+        delta = float(text)
+        if delta <= 0:
+            raise ValueError
+        return Bins(delta=delta)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+                "Invalid grid {0}".format(text))
+
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("data", 
@@ -82,56 +186,342 @@ def get_args():
                              "deltas may be used to impose "\
                              "grid boxes on the summary "\
                              "rather than using point "\
-                             "values.",
-                         nargs="+", type = float
+                             "values.  Each is a box "\
+                             "width, edges:E1,E2,... or "\
+                             "log:DECADES.",
+                         nargs="+", type = is_bins
                        )
     parser.add_argument("-o", "--output-directory",
                         default="/gpfs/scratch/mjw5407/"
                                 "task1/stats/"
                        )
+    parser.add_argument("-c", "--chunk", type=int,
+                        help="read the data this many rows "\
+                             "at a time, keeping running "\
+                             "statistics, for data too "\
+                             "big to read whole")
+    parser.add_argument("-e", "--error", type=float,
+                        default=0.005,
+                        help="with --chunk, the rank error "\
+                             "aimed at in quantiles, as a "\
+                             "fraction of the group size.  "\
+                             "Not a bound: the sketch is "\
+                             "randomized.")
+    parser.add_argument("-t", "--store", action="store_true",
+                        help="also write the joined data as "\
+                             "a table (see tablestore.py), "\
+                             "which is read instead of the "\
+                             "text while the inputs are "\
+                             "unchanged.  Not with --chunk.")
     return parser.parse_args()
 
-def compute(data, stat):
-    if stat == "mean":
-        return data.mean()
-    if stat == "variance":
-        return data.var()
-    if is_quantile(stat):
-        quantile = float(stat[1:]) / 100.0
-        if quantile == 0.0:
-            return data.min()
-        return data.quantile(quantile)
-    if stat == "max" or stat == "q100":
-        return data.max()
-    if stat == "min":
-        return data.min()
+def _quantiles(values, starts, counts, quantile):
+    """
+    Linear interpolation between order statistics, the way
+    numpy.percentile does it, for groups of sorted values
+    """
+    result = numpy.empty(len(counts))
+    result.fill(numpy.nan)
+    some = counts > 0
+    position = quantile * (counts[some] - 1)
+    below = numpy.floor(position)
+    above = numpy.minimum(below + 1, counts[some] - 1)
+    weight = position - below
+    base = starts[some]
+    result[some] = values[base + below.astype(int)] \
+                 * (1.0 - weight) \
+                 + values[base + above.astype(int)] * weight
+    return result
+
+def _extreme(values, starts, counts, last):
+    result = numpy.empty(len(counts))
+    result.fill(numpy.nan)
+    some = counts > 0
+    if last:
+        ends = starts[some] + counts[some] - 1
+        result[some] = values[ends]
+    else:
+        result[some] = values[starts[some]]
+    return result
+
+def _variance(values, codes, counts):
+    """
+    Sample variance of groups of values, in group order,
+    from sums of differences from each group's first value,
+    which keeps the sums small, and makes the variance of
+    a constant group exactly zero.
+    """
+    ngroups = len(counts)
+    starts = numpy.cumsum(counts) - counts
+    some = counts > 0
+    first = numpy.zeros(ngroups)
+    first[some] = values[starts[some]]
+    shifted = values - first[codes]
+    total = numpy.bincount(codes, shifted,
+                           minlength=ngroups)
+    squares = numpy.bincount(codes, shifted * shifted,
+                             minlength=ngroups)
+    spread = numpy.maximum(squares - total * total / counts,
+                           0.0)
+    return numpy.where(counts > 1, spread / (counts - 1),
+                       numpy.nan)
+
+def _restore(table, dtypes):
+    """
+    Integer results back to their columns' integer type,
+    if nothing is lost, as pandas does for its own
+    aggregations.  Like pandas, decide for all the columns
+    of a type together.
+    """
+    for dtype in set(dtypes.values()):
+        if dtype.kind not in "iu":
+            continue
+        names = [name for name in table
+                 if dtypes[name] == dtype]
+        block = numpy.array([table[name] for name in names])
+        if block.size == 0 or numpy.isnan(block).any():
+            continue
+        if numpy.allclose(block.astype(dtype), block,
+                          rtol=0):
+            for name in names:
+                table[name] = table[name].astype(dtype)
+
+def _ranked(values, codes, sizes):
+    """
+    values, one column per variable and rows in group
+    order, sorted within each group with missing values
+    last.  Returns the sorted values and where each group
+    starts in them.
+    """
+    ngroups = len(sizes)
+    starts = numpy.cumsum(sizes) - sizes
+    width = sizes.max() if ngroups else 0
+    if ngroups * width <= 2 * len(values):
+        # pad the groups to one size and sort them together
+        padded = numpy.empty((ngroups, width,
+                              values.shape[1]))
+        padded.fill(numpy.nan)
+        padded[codes, numpy.arange(len(codes))
+                      - starts[codes]] = values
+        padded.sort(axis=1)
+        return (padded.reshape(ngroups * width, -1),
+                numpy.arange(ngroups) * width)
+    # sort on value, then stably on group
+    ranked = numpy.empty_like(values)
+    for column in range(values.shape[1]):
+        bysize = numpy.argsort(values[:, column])
+        bygroup = numpy.argsort(codes[bysize],
+                                kind="mergesort")
+        ranked[:, column] = values[bysize[bygroup], column]
+    return ranked, starts
+
+def summarize(data, stats, togroupby):
+    """
+    Every statistic in stats, of every column not grouped
+    on, for each group, in one pass.  Returns a table with
+    a column for each (statistic, column).
+    """
+    grouped = data.groupby(togroupby)
+    index = grouped.size().index
+    codes = grouped.ngroup().values
+    columns = [name for name in data.columns
+               if name not in togroupby]
+    ngroups = len(index)
+    # rows in group order, keeping their order within groups
+    order = numpy.argsort(codes, kind="mergesort")
+    order = order[codes[order] >= 0]
+    codes = codes[order]
+    sizes = numpy.bincount(codes, minlength=ngroups)
+    matrix = data[columns].values.astype(float)[order]
+    allranked, starts = _ranked(matrix, codes, sizes)
+    tables = dict([(stat, {}) for stat in stats])
+    for column, name in enumerate(columns):
+        values = matrix[:, column]
+        ranked = allranked[:, column]
+        valid = ~numpy.isnan(values)
+        counts = numpy.bincount(codes[valid],
+                                minlength=ngroups)
+        with numpy.errstate(invalid="ignore",
+                            divide="ignore"):
+            sums = numpy.bincount(codes[valid],
+                                  values[valid],
+                                  minlength=ngroups)
+            mean = sums / counts
+            if "variance" in stats:
+                variance = _variance(values[valid],
+                                     codes[valid], counts)
+        for stat in stats:
+            if stat == "mean":
+                result = mean
+            elif stat == "variance":
+                result = variance
+            elif stat in ("max", "q100"):
+                result = _extreme(ranked, starts, counts,
+                                  True)
+            elif stat in ("min", "q0"):
+                result = _extreme(ranked, starts, counts,
+                                  False)
+            else:
+                result = _quantiles(ranked, starts, counts,
+                                    float(stat[1:]) / 100.0)
+            tables[stat][name] = result
+    dtypes = dict([(name, data[name].dtype)
+                   for name in columns])
+    for stat in stats:
+        if stat in ("mean", "max", "q100", "min", "q0"):
+            _restore(tables[stat], dtypes)
+    labels = [(stat, name) for stat in stats
+              for name in columns]
+    wide = dict([((stat, name), tables[stat][name])
+                 for stat, name in labels])
+    columns = pandas.MultiIndex.from_tuples(labels)
+    return pandas.DataFrame(wide, index=index, columns=columns)
+
+def split(wide, group, stats):
+    """
+    (tag, table) for each statistic in a wide result
+    """
+    return [("{0}_{1}".format("_".join(group), stat),
+             wide[stat]) for stat in stats]
+
+def _relabel(index, bins):
+    """
+    index with each gridded level's codes replaced by the
+    lower edges of their boxes
+    """
+    levels = []
+    for level, name in enumerate(index.names):
+        values = index.get_level_values(level)
+        if name in bins:
+            values = pandas.Index(bins[name].lower(values),
+                                  name=name)
+        levels.append(values)
+    if len(levels) == 1:
+        return levels[0]
+    return pandas.MultiIndex.from_arrays(levels,
+                                         names=index.names)
+
+def _grid(data, group, deltas):
+    """
+    (data, togroupby, bins): data with a grid_* column of
+    box numbers for each of the first parameters in group
+    with deltas, keeping only rows that fall in a box
+    """
+    togroupby = list(group)
+    bins = {}
+    binned = numpy.ones(len(data), dtype=bool)
+    for ii, grid in enumerate((deltas or [])[:len(group)]):
+        if not isinstance(grid, Bins):
+            grid = Bins(delta=grid)
+        colname = "grid_{0}".format(group[ii])
+        codes, inside = grid.codes(data[group[ii]].values)
+        bins[colname] = grid
+        binned &= inside
+        togroupby[ii] = colname
+        data = data.assign(**{colname: codes})
+    if not binned.all():
+        data = data[binned]
+    return data, togroupby, bins
 
 def analyze(data, stats, group=None, deltas=None):
-    results = []
+    """
+    deltas: grid boxes for the first parameters in group,
+    each a Bins or a box width.
+    """
     if group is None:
         group = ["Set"]
-    togroupby = copy.copy(group)
-    ii = 0
-    if deltas is None:
-        togroupby = group
-    else:
-        while ii < len(group) and ii < len(deltas):
-            colname = "grid_{0}".format(group[ii])
-            gridnumbers = numpy.floor(data[group[ii]].apply(
-                            lambda val: val / deltas[ii]))
-            data[colname] = gridnumbers.apply(
-                            lambda val: val * deltas[ii])
-            togroupby[ii] = colname
-            ii += 1
-        
+    data, togroupby, bins = _grid(data, group, deltas)
+
     print "analyzing grouped by {0}".format(group)
-    gb = data.groupby(togroupby)
+    print "computing {0}".format(", ".join(stats))
+    wide = summarize(data, stats, togroupby)
+    if bins:
+        wide.index = _relabel(wide.index, bins)
+    return split(wide, group, stats)
+
+def joined_chunks(chunks, parameterizations):
+    """
+    Each chunk joined to the parameterizations, and then
+    the rows an outer join adds for sets with no data
+    """
+    seen = set()
+    chunk = None
+    for chunk in chunks:
+        seen.update(chunk["Set"].values)
+        yield chunk.join(parameterizations, on=["Set"],
+                         how="left")
+    if chunk is None:
+        return
+    missing = parameterizations.index.difference(
+                    pandas.Index(sorted(seen)))
+    if len(missing):
+        extra = pandas.DataFrame({"Set": missing.values})
+        extra = extra.reindex(columns=chunk.columns)
+        yield extra.join(parameterizations, on=["Set"])
+
+def analyze_chunks(chunks, stats, group=None, deltas=None,
+                   error=0.005):
+    """
+    analyze for data read in chunks, already joined to the
+    parameterizations (see joined_chunks), each folded into
+    running statistics (see streaming.py).  Quantiles are
+    sketched, aiming at a rank error of about error times
+    the number of values in a group.
+    """
+    if group is None:
+        group = ["Set"]
+    print "analyzing grouped by {0}".format(group)
+    print "computing {0}".format(", ".join(stats))
+    sketched = any([is_quantile(stat) for stat in stats
+                    if stat not in ("q0", "q100")])
+    accumulator = None
+    dtypes = {}
+    for joined in chunks:
+        joined, togroupby, bins = _grid(joined, group, deltas)
+        if accumulator is None:
+            columns = [name for name in joined.columns
+                       if name not in togroupby]
+            accumulator = streaming.Accumulator(
+                            columns, sketched,
+                            streaming.capacity(error))
+        for name in accumulator.columns:
+            dtypes[name] = numpy.result_type(
+                            dtypes.get(name, joined[name].dtype),
+                            joined[name].dtype)
+        grouped = joined.groupby(togroupby)
+        codes = grouped.ngroup().values
+        present = codes >= 0
+        numbers = accumulator.numbered(grouped.size().index)
+        values = joined[accumulator.columns].values
+        accumulator.update(values.astype(float)[present],
+                           numbers[codes[present]])
+    if accumulator is None or len(accumulator) == 0:
+        return []
+    # groups in the order groupby sorts them
+    order = sorted(range(len(accumulator)),
+                   key=lambda number: accumulator.keys[number])
+    keys = [accumulator.keys[number] for number in order]
+    if len(togroupby) == 1:
+        index = pandas.Index(keys, name=togroupby[0])
+    else:
+        index = pandas.MultiIndex.from_tuples(keys,
+                                              names=togroupby)
+    tables = dict([(stat, {}) for stat in stats])
     for stat in stats:
-        print "computing {0}".format(stat)
-        tag = "{0}_{1}".format("_".join(group), stat)
-        results.append((tag, compute(gb, stat)))
-        
-    return results
+        found = accumulator.statistic(stat)[order]
+        for column, name in enumerate(accumulator.columns):
+            tables[stat][name] = found[:, column]
+        if stat in ("mean", "max", "q100", "min", "q0"):
+            _restore(tables[stat], dtypes)
+    labels = [(stat, name) for stat in stats
+              for name in accumulator.columns]
+    wide = dict([((stat, name), tables[stat][name])
+                 for stat, name in labels])
+    columns = pandas.MultiIndex.from_tuples(labels)
+    wide = pandas.DataFrame(wide, index=index, columns=columns)
+    if bins:
+        wide.index = _relabel(wide.index, bins)
+    return split(wide, group, stats)
 
 def write_result(infn, result, outputdir):
     fn = "_".join([result[0], os.path.basename(infn)])
@@ -142,7 +532,9 @@ def write_result(infn, result, outputdir):
 
 def cli():
     args = get_args()
-    data = pandas.read_table(args.data, sep=" ")
+    sources = tablestore.stamps([args.data.name,
+                                 args.parameterizations.name,
+                                 args.parameters.name])
     parameters = pandas.read_table(
                                args.parameters, sep=" ",
                                names=["name","low","high"],
@@ -153,15 +545,41 @@ def cli():
                                sep=" ",
                                names = param_names,
                                header = None)
-    data = data.join(parameterizations, on=["Set"], 
-                     how="outer")
 
     if args.deltas is not None:
         deltas = args.deltas
     else:
         deltas = []
 
-    results = analyze(data, args.stats, args.group, deltas)
+    table = tablestore.tablename(args.data.name)
+    fresh = tablestore.is_fresh(table, [
+                    path for path, _, _ in sources])
+    if fresh:
+        print "reading {0}".format(table)
+        store = tablestore.TableStore(table)
+    if args.chunk is not None:
+        if fresh:
+            chunks = store.chunks(args.chunk)
+        else:
+            chunks = joined_chunks(
+                        pandas.read_table(args.data, sep=" ",
+                                          chunksize=args.chunk),
+                        parameterizations)
+        results = analyze_chunks(chunks, args.stats, args.group,
+                                 deltas, args.error)
+    else:
+        if fresh:
+            data = store.frame()
+        else:
+            data, rows = tablestore.join(
+                        pandas.read_table(args.data, sep=" "),
+                        parameterizations)
+            if args.store:
+                print "writing {0}".format(table)
+                tablestore.write_table(data, rows, table,
+                                       sources)
+        results = analyze(data, args.stats, args.group,
+                          deltas)
     for result in results:
         write_result(args.data.name, result, 
                      args.output_directory)
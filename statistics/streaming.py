@@ -0,0 +1,259 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+streaming.py
+Statistics of a table too big to hold, accumulated a block
+of rows at a time (see statistics.py --chunk).
+
+Each block's count, mean and sum of squared deviations per
+group are merged into the running ones the way Welford's
+update is generalized to blocks (Chan et al.), so means
+and variances agree with the in-memory ones to rounding.
+Minima and maxima are exact.
+
+Quantiles come from a KLL-style sketch per group and
+column.  Values are kept as they are until a level holds k
+of them; then it is sorted and every other one, starting
+at random from the first or second, goes up a level,
+standing for two.  Quantiles are read off the weighted
+values, interpolated as numpy.percentile does, so they are
+exact for groups of fewer than k values.  Otherwise the
+rank error is random, typically a small multiple of n / k
+for n values; k = 2 / error aims at about error times n,
+but that is a target, not a bound.
+"""
+import numpy
+
+def capacity(error):
+    """
+    Values per sketch level aiming at a rank error of about
+    error times the number of values
+    """
+    return max(2, int(numpy.ceil(2.0 / error)))
+
+def block_moments(values, numbers, ngroups):
+    """
+    (count, mean, sum of squared deviations) of the values
+    that aren't missing, for each group
+    """
+    valid = ~numpy.isnan(values)
+    values = values[valid]
+    numbers = numbers[valid]
+    count = numpy.bincount(numbers, minlength=ngroups)
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        mean = numpy.bincount(numbers, values,
+                              minlength=ngroups) / count
+        deviation = values - mean[numbers]
+        m2 = numpy.bincount(numbers, deviation * deviation,
+                            minlength=ngroups)
+    return count, mean, m2
+
+def merge_moments(first, second):
+    """
+    The moments of two sets of values together, from each
+    one's (count, mean, sum of squared deviations)
+    """
+    count, mean, m2 = first
+    more, other, m2more = second
+    total = count + more
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        delta = other - mean
+        merged = mean + delta * more / total
+        # with infinities, the mean of the sums
+        odd = ~numpy.isfinite(delta)
+        merged[odd] = (mean[odd] * count[odd]
+                       + other[odd] * more[odd]) / total[odd]
+        m2 = m2 + m2more \
+           + delta * delta * count * more / total
+    return total, merged, m2
+
+class QuantileSketch(object):
+    def __init__(self, k, random):
+        self.k = k
+        self.random = random
+        self.levels = [numpy.empty(0)]
+
+    def update(self, values):
+        self.levels[0] = numpy.concatenate(
+                            [self.levels[0], values])
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            values = self.levels[level]
+            if len(values) >= self.k:
+                values = numpy.sort(values)
+                # an odd one out stays where it is
+                keep = len(values) % 2
+                offset = self.random.randint(2)
+                promoted = values[keep + offset::2]
+                if level + 1 == len(self.levels):
+                    self.levels.append(numpy.empty(0))
+                above = self.levels[level + 1]
+                above = numpy.concatenate([above, promoted])
+                self.levels[level + 1] = above
+                self.levels[level] = values[:keep]
+            level += 1
+
+    def __len__(self):
+        return sum([len(found) * 2 ** level for level, found
+                    in enumerate(self.levels)])
+
+    def quantile(self, quantile):
+        count = len(self)
+        if count == 0:
+            return numpy.nan
+        values = numpy.concatenate(self.levels)
+        weights = numpy.concatenate(
+                    [numpy.repeat(2 ** level, len(found))
+                     for level, found
+                     in enumerate(self.levels)])
+        order = numpy.argsort(values, kind="mergesort")
+        values = values[order]
+        # the last rank each value stands for
+        last = numpy.cumsum(weights[order]) - 1
+        position = quantile * (count - 1)
+        below = numpy.floor(position)
+        above = min(below + 1, count - 1)
+        weight = position - below
+        low, high = values[numpy.searchsorted(
+                            last, [below, above])]
+        return low * (1.0 - weight) + high * weight
+
+class Accumulator(object):
+    """
+    Running statistics of columns, per group.
+
+    columns: names of the columns summarized
+    sketched: whether quantiles are wanted
+    k: values per sketch level
+    """
+    def __init__(self, columns, sketched=False, k=200,
+                 seed=0):
+        self.columns = list(columns)
+        self.sketched = sketched
+        self.k = k
+        self.random = numpy.random.RandomState(seed)
+        # group key: group number, in order of appearance
+        self.numbers = {}
+        self.keys = []
+        shape = (0, len(self.columns))
+        self.count = numpy.zeros(shape)
+        self.mean = numpy.zeros(shape)
+        self.m2 = numpy.zeros(shape)
+        self.low = numpy.zeros(shape)
+        self.high = numpy.zeros(shape)
+        # (group number, column number): sketch
+        self.sketches = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def numbered(self, keys):
+        """
+        The group number of each key, numbering new ones
+        """
+        found = []
+        for key in keys:
+            if key not in self.numbers:
+                self.numbers[key] = len(self.keys)
+                self.keys.append(key)
+            found.append(self.numbers[key])
+        grow = len(self.keys) - len(self.count)
+        if grow > 0:
+            more = numpy.zeros((grow, len(self.columns)))
+            self.count = numpy.vstack([self.count, more])
+            self.mean = numpy.vstack([self.mean, more])
+            self.m2 = numpy.vstack([self.m2, more])
+            more.fill(numpy.nan)
+            self.low = numpy.vstack([self.low, more])
+            self.high = numpy.vstack([self.high, more])
+        return numpy.array(found, dtype=int)
+
+    def update(self, values, numbers):
+        """
+        Fold in a block: values has a row for each row of
+        the block and a column for each column, and numbers
+        is each row's group number.
+        """
+        order = numpy.argsort(numbers, kind="mergesort")
+        numbers = numbers[order]
+        values = values[order]
+        groups, starts = numpy.unique(numbers,
+                                      return_index=True)
+        ends = numpy.append(starts[1:], len(numbers))
+        for column in range(len(self.columns)):
+            found = values[:, column]
+            moments = block_moments(found, numbers,
+                                    len(self.keys))
+            some = moments[0] > 0
+            running = (self.count[some, column],
+                       self.mean[some, column],
+                       self.m2[some, column])
+            block = [part[some] for part in moments]
+            merged = merge_moments(running, block)
+            self.count[some, column] = merged[0]
+            self.mean[some, column] = merged[1]
+            self.m2[some, column] = merged[2]
+            with numpy.errstate(invalid="ignore"):
+                low = numpy.fmin.reduceat(found, starts)
+                high = numpy.fmax.reduceat(found, starts)
+            self.low[groups, column] = numpy.fmin(
+                            self.low[groups, column], low)
+            self.high[groups, column] = numpy.fmax(
+                            self.high[groups, column], high)
+            if not self.sketched:
+                continue
+            for group, start, end in zip(groups, starts,
+                                         ends):
+                block = found[start:end]
+                block = block[~numpy.isnan(block)]
+                if len(block) == 0:
+                    continue
+                key = (group, column)
+                if key not in self.sketches:
+                    self.sketches[key] = QuantileSketch(
+                                        self.k, self.random)
+                self.sketches[key].update(block)
+
+    def statistic(self, stat):
+        """
+        An array of stat, a row for each group and a column
+        for each column
+        """
+        with numpy.errstate(invalid="ignore",
+                            divide="ignore"):
+            if stat == "mean":
+                return numpy.where(self.count > 0, self.mean,
+                                   numpy.nan)
+            if stat == "variance":
+                return numpy.where(self.count > 1,
+                                   self.m2 / (self.count - 1),
+                                   numpy.nan)
+        if stat in ("max", "q100"):
+            return self.high.copy()
+        if stat in ("min", "q0"):
+            return self.low.copy()
+        quantile = float(stat[1:]) / 100.0
+        result = numpy.empty(self.count.shape)
+        result.fill(numpy.nan)
+        for (group, column), sketch in self.sketches.items():
+            result[group, column] = sketch.quantile(quantile)
+        return result
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
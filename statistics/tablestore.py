@@ -0,0 +1,280 @@
+"""
+Copyright (C) 2013 Matthew Woodruff
+
+This script is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This script is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this script. If not, see <http://www.gnu.org/licenses/>.
+
+===========================================================
+tablestore.py
+
+A binary, columnar copy of a metrics file joined to its
+parameterizations, so that the text is parsed and joined
+once rather than by every stage.  Borg_27_3_0.1.hv goes to
+the directory Borg_27_3_0.1.table:
+
+    columns.txt     the column names, in order
+    sources.txt     size, modification time and path of
+                    each file the table was made from, as
+                    they were when it was read
+    {column}.npy    each column, with its own dtype
+    _rows.npy       int64, the line of the metrics file
+                    each row came from, or -1 for the rows
+                    the outer join adds for sets with no
+                    metrics
+
+Rows are in the order the join puts them in, so statistics
+read from a table are the same as from the text.  The
+arrays are memory-mapped, so only the columns used are
+read.
+
+A table is used only if the metrics file and the
+parameterizations it was joined to still have the sizes and
+modification times recorded in sources.txt, so a source
+replaced by an older file, or rewritten within the same
+second, is noticed; load falls back to the text otherwise.
+Tables without sources.txt are never fresh.
+
+If invoked at the command line, write tables for metrics
+files.
+"""
+import os
+import re
+import shutil
+import argparse
+import numpy
+import pandas
+
+class TableFormatError(Exception):
+    pass
+
+SUFFIX = ".table"
+ROWS = "_rows"
+
+def is_table(path):
+    return os.path.isdir(path) \
+       and path.rstrip("/").endswith(SUFFIX)
+
+def tablename(filename):
+    return re.sub("\.hv$", "", filename) + SUFFIX
+
+SOURCES = "sources.txt"
+
+def stamps(sources):
+    """
+    (path, size, modification time) for each source, to
+    record in a table.  Take them before reading the
+    sources.
+    """
+    found = []
+    for source in sources:
+        if source is None:
+            continue
+        stat = os.stat(source)
+        found.append((os.path.abspath(source), stat.st_size,
+                      stat.st_mtime))
+    return found
+
+def recorded_stamps(table):
+    """
+    {path: (size, modification time)} recorded in a table,
+    or None if it recorded none
+    """
+    filename = os.path.join(table, SOURCES)
+    if not os.path.exists(filename):
+        return None
+    recorded = {}
+    with open(filename, "r") as fp:
+        for line in fp:
+            size, mtime, path = line.rstrip("\n").split(" ", 2)
+            recorded[path] = (int(size), float(mtime))
+    return recorded
+
+def is_fresh(table, sources):
+    """
+    Whether table exists and every source is as it was
+    when the table was made from it
+    """
+    if not is_table(table):
+        return False
+    recorded = recorded_stamps(table)
+    if recorded is None:
+        return False
+    return all([recorded.get(path) == (size, mtime)
+                for path, size, mtime in stamps(sources)])
+
+def read_parameterizations(sobolfile, paramsfile):
+    parameters = pandas.read_table(paramsfile, sep=" ",
+                                   names=["name","low","high"],
+                                   header=None)
+    return pandas.read_table(sobolfile, sep=" ",
+                             names=parameters["name"].values,
+                             header=None)
+
+def join(data, parameterizations):
+    """
+    (joined, rows): data outer-joined to the
+    parameterizations on Set, and the row of data each row
+    came from, -1 for sets with no data.
+    """
+    data = data.assign(**{ROWS: numpy.arange(len(data))})
+    joined = data.join(parameterizations, on=["Set"],
+                       how="outer")
+    rows = joined[ROWS].fillna(-1).values.astype(numpy.int64)
+    return joined.drop(ROWS, axis=1), rows
+
+class TableStore(object):
+    def __init__(self, directory):
+        self.directory = directory
+        names = os.path.join(directory, "columns.txt")
+        with open(names, "r") as fp:
+            self.columns = [line.rstrip("\n") for line in fp]
+        self.rows = self._load(ROWS)
+
+    def _path(self, name):
+        return os.path.join(self.directory,
+                            "{0}.npy".format(name))
+
+    def _load(self, name):
+        return numpy.load(self._path(name), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.rows)
+
+    def column(self, name):
+        if name not in self.columns:
+            msg = "{0} has no column {1}".format(self.directory,
+                                                 name)
+            raise TableFormatError(msg)
+        return self._load(name)
+
+    def frame(self, columns=None, measured=False, start=0,
+              stop=None):
+        """
+        A DataFrame of columns (all by default) for rows
+        start to stop.  With measured, only the rows of the
+        metrics file, in its order.
+        """
+        if columns is None:
+            columns = self.columns
+        if measured:
+            which = numpy.argsort(self.rows, kind="mergesort")
+            which = which[self.rows[which] >= 0][start:stop]
+        else:
+            which = slice(start, stop)
+        return pandas.DataFrame(
+                    dict([(name, self.column(name)[which])
+                          for name in columns]),
+                    columns=columns)
+
+    def chunks(self, rows, columns=None):
+        """
+        Yield the table rows at a time
+        """
+        for start in range(0, len(self), rows):
+            yield self.frame(columns, start=start,
+                             stop=start + rows)
+
+def write_table(joined, rows, table, sources=()):
+    """
+    Write a table for a joined frame.  Return its name.
+    sources: stamps of the files it was made from.
+    """
+    partial = "{0}.{1}.partial".format(table.rstrip("/"),
+                                       os.getpid())
+    os.makedirs(partial)
+    for name in joined.columns:
+        values = joined[name].values
+        if values.dtype.kind not in "biuf":
+            shutil.rmtree(partial)
+            msg = "{0} is not numeric".format(name)
+            raise TableFormatError(msg)
+        numpy.save(os.path.join(partial,
+                                "{0}.npy".format(name)), values)
+    numpy.save(os.path.join(partial, ROWS + ".npy"),
+               numpy.asarray(rows, dtype=numpy.int64))
+    with open(os.path.join(partial, "columns.txt"), "w") as fp:
+        for name in joined.columns:
+            fp.write("{0}\n".format(name))
+    with open(os.path.join(partial, SOURCES), "w") as fp:
+        for path, size, mtime in sources:
+            fp.write("{0} {1!r} {2}\n".format(size, mtime, path))
+    if os.path.exists(table):
+        shutil.rmtree(table)
+    os.rename(partial, table)
+    return table
+
+def materialize(hvfile, parameterizations, sources=()):
+    """
+    The metrics in hvfile joined to the parameterizations,
+    from its table if that's fresh, otherwise from the text,
+    writing the table.  sources: the files the
+    parameterizations came from.
+    """
+    table = tablename(hvfile)
+    if is_fresh(table, [hvfile] + list(sources)):
+        return TableStore(table).frame()
+    found = stamps([hvfile] + list(sources))
+    data = pandas.read_table(hvfile, sep=" ")
+    joined, rows = join(data, parameterizations)
+    write_table(joined, rows, table, found)
+    return joined
+
+def load(hvfile, parameterizations=None, sources=(),
+         columns=None):
+    """
+    The metrics in hvfile, from its table if that's fresh,
+    otherwise from the text.  Joined to the
+    parameterizations if they're given; if not, only the
+    rows of hvfile, in order.
+    """
+    table = tablename(hvfile)
+    if is_fresh(table, [hvfile] + list(sources)):
+        return TableStore(table).frame(
+                    columns, measured=parameterizations is None)
+    data = pandas.read_table(hvfile, sep=" ")
+    if parameterizations is not None:
+        data = join(data, parameterizations)[0]
+    if columns is not None:
+        data = data[columns]
+    return data
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filenames", nargs="+",
+                        help="metrics files to write tables "\
+                             "for")
+    parser.add_argument("-p", "--params-directory",
+                        default="./params",
+                        help="where {algo}_Params and "\
+                             "{algo}_Sobol are")
+    return parser.parse_args()
+
+def cli():
+    args = get_args()
+    for filename in args.filenames:
+        algo = os.path.basename(filename).split("_")[0]
+        sobolfile = os.path.join(args.params_directory,
+                                 algo + "_Sobol")
+        paramsfile = os.path.join(args.params_directory,
+                                  algo + "_Params")
+        parameterizations = read_parameterizations(sobolfile,
+                                                   paramsfile)
+        joined = materialize(filename, parameterizations,
+                             [sobolfile, paramsfile])
+        print "{0}: {1} rows".format(tablename(filename),
+                                     len(joined))
+
+if __name__ == "__main__":
+    cli()
+
+# vim:ts=4:sw=4:expandtab:ai:colorcolumn=60:number:fdm=indent
@@ -29,6 +29,9 @@ import argparse
 import pandas
 import time
 from collections import namedtuple
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "hv"))
+import setsindex
 
 class InvalidProblemError(Exception): pass
 
@@ -75,16 +78,11 @@ class Job(object):
         have been run
         """
         filename = self.setsfile()
-        count = 0
         if not os.path.isfile(filename):
             return 0
 
-        with open(filename, 'rb') as ifp:
-            for line in ifp:
-                if "EvaluationTime" in line:
-                    count += 1
-
-        return count
+        # only what was appended since last time is read
+        return len(setsindex.index(filename))
 
     def pbs_script(self):
         """